@@ -1,3 +1,29 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from .authentication import CookieJWTAuthentication
+
+
+class CookieJWTAuthenticationTests(TestCase):
+    """Cookie authentication steps aside when the cookie is missing or invalid."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("viewer", "viewer@example.com", "secret")
+        self.factory = APIRequestFactory()
+
+    def authenticate(self, cookie: str = None):
+        request = self.factory.get("/api/video/")
+        if cookie:
+            request.COOKIES["access_token"] = cookie
+        return CookieJWTAuthentication().authenticate(Request(request))
+
+    def test_valid_cookie(self):
+        user, token = self.authenticate(str(AccessToken.for_user(self.user)))
+        self.assertEqual(user, self.user)
+
+    def test_missing_or_invalid_cookie_falls_through(self):
+        self.assertIsNone(self.authenticate())
+        self.assertIsNone(self.authenticate("expired.or.invalid"))
@@ -38,10 +38,18 @@ else:
     print(f"Superuser '{username}' already exists.")
 EOF
 
-python manage.py rqworker default &
-python manage.py rqworker default &
 python manage.py rqworker default &
 python manage.py rqworker default &
 python manage.py rqworker high &
 
+# Transcode-Worker: Vorrang-Queue zuerst, Threads pro Job = CPU-Budget / Anzahl Worker
+for i in $(seq 1 "${TRANSCODE_WORKERS:-2}"); do
+  python manage.py rqworker transcode_high transcode &
+done
+
+# Async-Auslieferung: ein Event-Loop pro Worker statt eines blockierten Sync-Workers pro Zuschauer
+if [ "$(echo "${HLS_ASYNC_DELIVERY:-False}" | tr '[:upper:]' '[:lower:]')" = "true" ]; then
+  exec uvicorn core.asgi:application --host 0.0.0.0 --port 8000 --workers "${WEB_WORKERS:-1}" --timeout-graceful-shutdown 120
+fi
+
 exec gunicorn core.wsgi:application --bind 0.0.0.0:8000 --reload --timeout 120 --graceful-timeout 120
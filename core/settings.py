@@ -127,9 +127,95 @@ RQ_QUEUES = {
         'DEFAULT_TIMEOUT': 900,
         'REDIS_CLIENT_KWARGS': {},
     },
+    # Encode jobs only; workers listen on transcode_high before transcode.
+    'transcode_high': {
+        'HOST': os.environ.get("REDIS_HOST", default="redis"),
+        'PORT': os.environ.get("REDIS_PORT", default=6379),
+        'DB': os.environ.get("REDIS_DB", default=0),
+        'DEFAULT_TIMEOUT': int(os.environ.get("TRANSCODE_JOB_TIMEOUT", default=3600)),
+        'REDIS_CLIENT_KWARGS': {},
+    },
+    'transcode': {
+        'HOST': os.environ.get("REDIS_HOST", default="redis"),
+        'PORT': os.environ.get("REDIS_PORT", default=6379),
+        'DB': os.environ.get("REDIS_DB", default=0),
+        'DEFAULT_TIMEOUT': int(os.environ.get("TRANSCODE_JOB_TIMEOUT", default=3600)),
+        'REDIS_CLIENT_KWARGS': {},
+    },
 }
 
 
+# Video processing
+# "single_pass" decodes each upload once for the whole HLS ladder,
+# "sequential" runs one ffmpeg process per variant,
+# "fanout" runs one RQ job per variant plus a dependent master-playlist job,
+# "chunked" encodes GOP-aligned chunks of the source as parallel RQ jobs,
+# "progressive" publishes the lowest rung while it is still being encoded.
+HLS_ENCODING_MODE = os.environ.get("HLS_ENCODING_MODE", default="single_pass")
+HLS_CHUNK_SECONDS = int(os.environ.get("HLS_CHUNK_SECONDS", default=120))
+# "muxed" puts the AAC track into every variant, "shared" encodes it once
+# as an audio-only rendition referenced through an EXT-X-MEDIA group.
+HLS_AUDIO_MODE = os.environ.get("HLS_AUDIO_MODE", default="muxed")
+# "ts" writes MPEG-TS segments, "fmp4" writes CMAF segments with an init section.
+HLS_SEGMENT_FORMAT = os.environ.get("HLS_SEGMENT_FORMAT", default="ts")
+# One file per rendition addressed through EXT-X-BYTERANGE instead of one file per segment.
+HLS_SINGLE_FILE = os.getenv("HLS_SINGLE_FILE", "False").lower() == "true"
+# Analyse each upload's complexity and derive per-video bitrate caps per rung.
+HLS_PER_TITLE_ENCODING = os.getenv("HLS_PER_TITLE_ENCODING", "False").lower() == "true"
+
+# Transcode scheduling
+# Encode jobs reserve ffmpeg threads from the per-host CPU budget and need
+# TRANSCODE_MEMORY_PER_JOB_MB of available memory before they start.
+# Threads per job = TRANSCODE_CPU_BUDGET // TRANSCODE_WORKERS.
+TRANSCODE_WORKERS = int(os.environ.get("TRANSCODE_WORKERS", default=2))
+TRANSCODE_CPU_BUDGET = int(os.environ.get("TRANSCODE_CPU_BUDGET", default=os.cpu_count() or 2))
+TRANSCODE_MEMORY_PER_JOB_MB = int(os.environ.get("TRANSCODE_MEMORY_PER_JOB_MB", default=1024))
+# Videos up to this length (and the lowest rung of every video) use transcode_high.
+TRANSCODE_PRIORITY_MAX_SECONDS = int(os.environ.get("TRANSCODE_PRIORITY_MAX_SECONDS", default=600))
+
+# HLS delivery
+# "django" streams playlists and segments from the gunicorn worker,
+# "x-accel" (nginx) and "x-sendfile" (Apache, lighttpd) only authorize the
+# request and let the front proxy send the file.
+HLS_DELIVERY_MODE = os.environ.get("HLS_DELIVERY_MODE", default="django")
+# Internal nginx location that maps to MEDIA_ROOT (x-accel only).
+HLS_ACCEL_REDIRECT_PREFIX = os.environ.get("HLS_ACCEL_REDIRECT_PREFIX", default="/protected-media/")
+# Finished segments are cached for a year, playlists and trickplay files are revalidated (ETag).
+HLS_SEGMENT_CACHE_CONTROL = os.environ.get("HLS_SEGMENT_CACHE_CONTROL", default="private, max-age=31536000, immutable")
+HLS_PLAYLIST_CACHE_CONTROL = os.environ.get("HLS_PLAYLIST_CACHE_CONTROL", default="private, no-cache")
+# Media playlists append an HMAC token to every segment URI, so segment
+# requests are verified without JWT user lookup or any database query.
+# Tokens expire HLS_SIGNED_URL_TTL seconds plus the video's length after issue.
+HLS_SIGNED_URLS = os.getenv("HLS_SIGNED_URLS", "False").lower() == "true"
+HLS_SIGNED_URL_TTL = int(os.environ.get("HLS_SIGNED_URL_TTL", default=900))
+# Base URL of a CDN in front of the HLS API paths (e.g. https://cdn.example.com/api).
+# Master and media playlists are then rendered per request with absolute URIs.
+HLS_CDN_BASE_URL = os.environ.get("HLS_CDN_BASE_URL", default="")
+# Per-process LRU cache for playlists, init sections and the first
+# HLS_HOT_CACHE_SEGMENTS segments of every rendition (0 MB disables it).
+# With HLS_HOT_CACHE_WARM a playlist cache miss asks the kernel to read
+# ahead those segments (also helps offloaded delivery).
+HLS_HOT_CACHE_MB = int(os.environ.get("HLS_HOT_CACHE_MB", default=64))
+HLS_HOT_CACHE_SEGMENTS = int(os.environ.get("HLS_HOT_CACHE_SEGMENTS", default=3))
+HLS_HOT_CACHE_WARM = os.getenv("HLS_HOT_CACHE_WARM", "False").lower() == "true"
+# Serve playlists and segments with async views; backend.entrypoint.sh then
+# starts uvicorn on core.asgi instead of gunicorn on core.wsgi.
+HLS_ASYNC_DELIVERY = os.getenv("HLS_ASYNC_DELIVERY", "False").lower() == "true"
+# Seconds a worker serves its copy of a rendition's segment manifest
+# (segments.json, mirrored in Redis) before re-reading it.
+HLS_SEGMENT_MANIFEST_TTL = int(os.environ.get("HLS_SEGMENT_MANIFEST_TTL", default=60))
+
+
+# Video catalog: default and maximum page size of GET /api/video/ (?page_size=)
+VIDEO_LIST_PAGE_SIZE = int(os.environ.get("VIDEO_LIST_PAGE_SIZE", default=24))
+VIDEO_LIST_MAX_PAGE_SIZE = int(os.environ.get("VIDEO_LIST_MAX_PAGE_SIZE", default=100))
+# Seconds a cached catalog page is served before one request rebuilds it
+# (0 disables the cache). Video saves and deletes start a new version at once.
+CATALOG_CACHE_TTL = int(os.environ.get("CATALOG_CACHE_TTL", default=300))
+# Videos per category in the home-screen rows (GET /api/video/rows/)
+CATALOG_ROWS_PER_CATEGORY = int(os.environ.get("CATALOG_ROWS_PER_CATEGORY", default=10))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
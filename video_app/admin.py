@@ -1,9 +1,43 @@
 from django.contrib import admin
-from .models import Video
+from .models import Video, EncodeStat, VideoUpload
+from .api.tasks import retry_failed_variants
+
+
+class EncodeStatInline(admin.TabularInline):
+    model = EncodeStat
+    extra = 0
+    can_delete = False
+    fields = ("created_at", "mode", "ladder_signature", "chunk_index", "wall_time", "cpu_time", "output_bytes")
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Video)
 class VideoAdmin(admin.ModelAdmin):
-    list_display = ("title", "created_at", "category", "thumbnail", "video_file")
+    list_display = ("title", "created_at", "category", "thumbnail", "video_file", "processing_status", "time_to_first_playable")
     search_fields = ("title", "description")
-    list_filter = ("category", "created_at")
\ No newline at end of file
+    list_filter = ("category", "created_at", "processing_status")
+    readonly_fields = (
+        "processing_status", "failed_variants", "hls_variants",
+        "first_playable_at", "time_to_first_playable",
+        "duration", "width", "height", "frame_rate",
+        "video_codec", "audio_codec", "audio_channels", "audio_channel_layout",
+        "thumbnail_sizes", "has_trickplay", "source_hash", "encoding_profile",
+    )
+    inlines = [EncodeStatInline]
+    actions = ["retry_failed"]
+
+    @admin.action(description="Retry failed HLS variants")
+    def retry_failed(self, request, queryset):
+        retried = [video for video in queryset if video.failed_variants]
+        for video in retried:
+            retry_failed_variants(video.id)
+        self.message_user(request, f"Queued failed variants for {len(retried)} video(s).")
+
+
+@admin.register(VideoUpload)
+class VideoUploadAdmin(admin.ModelAdmin):
+    list_display = ("filename", "title", "offset", "size", "video", "updated_at")
+    readonly_fields = ("offset", "video")
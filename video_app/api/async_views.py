@@ -0,0 +1,138 @@
+"""Async HLS views for ASGI servers: playlists and segments without pinning a worker per viewer."""
+import asyncio
+
+from django.contrib.auth import get_user_model
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_safe
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from ..models import Video
+from .delivery import (
+    PLAYLIST_CONTENT_TYPE,
+    afile_response,
+    get_playlist_cache_control,
+    get_segment_cache_control,
+    get_segment_content_type,
+    make_uri_rewriter,
+    playlist_needs_rewrite,
+    read_playlist_text,
+    rewritten_playlist_response,
+)
+from .manifests import aget_manifest_stat
+from .signing import (
+    SEGMENT_TOKEN_PARAM, SegmentTokenUser, get_token_expiry, make_segment_token, signed_urls_enabled, verify_segment_token,
+)
+from .utils import get_hls_master_playlist_path, get_hls_variant_playlist_path, get_hls_variant_segment_path
+
+
+NOT_AUTHENTICATED = {"detail": "Authentication credentials were not provided."}
+INVALID_SEGMENT_TOKEN = {"detail": "Invalid or expired segment token."}
+
+
+async def authenticate(request, movie_id: int, resolution: str = None):
+    """
+    Async counterpart of the DRF authentication chain of the sync views:
+    signed segment token, then access token cookie, then Authorization header.
+    Returns (user, error_response).
+    """
+    token = request.GET.get(SEGMENT_TOKEN_PARAM)
+    if token and resolution is not None:
+        user_id = verify_segment_token(token, movie_id, resolution)
+        if user_id is None:
+            return None, JsonResponse(INVALID_SEGMENT_TOKEN, status=403)
+        return SegmentTokenUser(user_id), None
+
+    jwt_auth = JWTAuthentication()
+    header = jwt_auth.get_header(request)
+    # Like CookieJWTAuthentication, an invalid cookie falls through to the header
+    raw_tokens = [request.COOKIES.get("access_token"), jwt_auth.get_raw_token(header) if header else None]
+
+    user_id = None
+    for raw_token in filter(None, raw_tokens):
+        try:
+            user_id = jwt_auth.get_validated_token(raw_token)[jwt_settings.USER_ID_CLAIM]
+            break
+        except (InvalidToken, TokenError, KeyError):
+            continue
+    if user_id is None:
+        return None, JsonResponse(NOT_AUTHENTICATED, status=401)
+
+    user = await get_user_model().objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}, is_active=True).afirst()
+    if user is None:
+        return None, JsonResponse(NOT_AUTHENTICATED, status=401)
+    return user, None
+
+
+async def get_video_duration(movie_id: int):
+    video = await Video.objects.filter(id=movie_id).values("duration").afirst()
+    if video is None:
+        raise Http404("Video not found")
+    return video["duration"]
+
+
+@require_safe
+async def hls_master_playlist(request, movie_id: int):
+    """Return master.m3u8, with variant URIs rewritten per request for signed or CDN URLs."""
+    user, error = await authenticate(request, movie_id)
+    if error:
+        return error
+    duration = await get_video_duration(movie_id)
+
+    master_path = get_hls_master_playlist_path(movie_id)
+    try:
+        if playlist_needs_rewrite():
+            token_for = None
+            if signed_urls_enabled():
+                expires = get_token_expiry(duration)
+                token_for = lambda rendition: make_segment_token(user.id, movie_id, rendition, expires)
+            text = await asyncio.to_thread(read_playlist_text, master_path)
+            return rewritten_playlist_response(master_path, make_uri_rewriter(movie_id, token_for=token_for), "master.m3u8", text)
+        return await afile_response(request, master_path, "master.m3u8", PLAYLIST_CONTENT_TYPE, get_playlist_cache_control())
+    except FileNotFoundError:
+        raise Http404("Playlist not found")
+
+
+@require_safe
+async def hls_playlist(request, movie_id: int, resolution: str):
+    """Return a media playlist, with signed or CDN segment URIs if configured."""
+    user, error = await authenticate(request, movie_id, resolution)
+    if error:
+        return error
+    duration = await get_video_duration(movie_id)
+
+    playlist_path = get_hls_variant_playlist_path(movie_id, resolution)
+    try:
+        stat = await aget_manifest_stat(movie_id, resolution, "index.m3u8")
+        if playlist_needs_rewrite():
+            token = make_segment_token(user.id, movie_id, resolution, get_token_expiry(duration)) if signed_urls_enabled() else None
+            text = await asyncio.to_thread(read_playlist_text, playlist_path)
+            return rewritten_playlist_response(playlist_path, make_uri_rewriter(movie_id, resolution, lambda rendition: token), text=text)
+        return await afile_response(request, playlist_path, "index.m3u8", PLAYLIST_CONTENT_TYPE, get_playlist_cache_control(), stat)
+    except FileNotFoundError:
+        raise Http404("Playlist not found")
+
+
+@require_safe
+async def hls_segment(request, movie_id: int, resolution: str, segment: str):
+    """Stream a segment, init section, single-file rendition or trickplay file, honouring Range requests."""
+    user, error = await authenticate(request, movie_id, resolution)
+    if error:
+        return error
+    # A signed token already binds user, video and rendition: no database access
+    if not isinstance(user, SegmentTokenUser) and not await Video.objects.filter(id=movie_id).aexists():
+        raise Http404("Video not found")
+
+    if "/" in segment or "\\" in segment:
+        raise Http404("Segment not found")
+
+    segment_path = get_hls_variant_segment_path(movie_id, resolution, segment)
+    try:
+        # Names the manifest does not list are rejected without touching the disk
+        stat = await aget_manifest_stat(movie_id, resolution, segment)
+        return await afile_response(
+            request, segment_path, segment, get_segment_content_type(segment_path), get_segment_cache_control(segment_path), stat
+        )
+    except FileNotFoundError:
+        raise Http404("Segment not found")
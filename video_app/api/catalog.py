@@ -0,0 +1,170 @@
+"""Versioned Redis cache of serialized catalog pages and category rows with ETag revalidation."""
+import hashlib, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+from .serializers import VideoListSerializer, absolute_video_urls
+from .services import list_category_rows_queryset
+
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_PAGE_KEY = "catalog:page:{version}:{digest}"
+CATALOG_LOCK_KEY = "catalog:lock:{version}:{digest}"
+CATALOG_CACHE_CONTROL = "private, no-cache"
+CATALOG_LOCK_TIMEOUT = 10
+CATALOG_LOCK_POLL = 0.05
+# Page key of the grouped home-screen rows, shared by all hosts (stored with relative URLs)
+CATEGORY_ROWS_DIGEST = "category-rows"
+
+# Video fields the catalog serializer shows; saves touching only other fields keep the cache
+CATALOG_FIELDS = {"title", "description", "category", "created_at", "thumbnail", "thumbnail_sizes", "has_trickplay", "hls_variants"}
+
+# Query parameters that select a page; everything else is ignored for the key
+CATALOG_PARAMS = ("category", "cursor", "page_size")
+
+
+def get_catalog_cache_ttl() -> int:
+    return getattr(settings, "CATALOG_CACHE_TTL", 300)
+
+
+def get_catalog_version() -> int:
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version() -> int:
+    """Start a new catalog version; pages of the old one are never read again and expire."""
+    cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+    return cache.incr(CATALOG_VERSION_KEY)
+
+
+def affects_catalog(update_fields) -> bool:
+    return update_fields is None or bool(CATALOG_FIELDS & set(update_fields))
+
+
+def get_page_digest(request) -> str:
+    """Scheme and host (the page holds absolute URLs) plus the page-selecting parameters."""
+    params = "&".join(f"{name}={request.query_params.get(name, '')}" for name in CATALOG_PARAMS)
+    return hashlib.sha1(f"{request.scheme}://{request.get_host()}?{params}".encode()).hexdigest()
+
+
+def catalog_etag(version: int, digest: str) -> str:
+    return f'"catalog-{version}-{digest[:16]}"'
+
+
+def get_cached_page(version: int, digest: str, build_page) -> dict:
+    """
+    Cached page data of this catalog version, built by build_page() on a miss.
+    Pages carry a soft expiry: once it passes, one request (holding the lock)
+    rebuilds the page while the others keep serving the old copy. On a cold
+    key the others wait for the lock holder instead of querying the database too.
+    """
+    key = CATALOG_PAGE_KEY.format(version=version, digest=digest)
+    lock_key = CATALOG_LOCK_KEY.format(version=version, digest=digest)
+
+    entry = cache.get(key)
+    if entry is not None and entry["expires"] > time.time():
+        return entry["data"]
+
+    if cache.add(lock_key, 1, timeout=CATALOG_LOCK_TIMEOUT):
+        try:
+            data = build_page()
+            store_page(version, digest, data)
+            return data
+        finally:
+            cache.delete(lock_key)
+
+    if entry is not None:
+        return entry["data"]
+
+    waited = 0.0
+    while waited < CATALOG_LOCK_TIMEOUT:
+        time.sleep(CATALOG_LOCK_POLL)
+        waited += CATALOG_LOCK_POLL
+        entry = cache.get(key)
+        if entry is not None:
+            return entry["data"]
+        if cache.get(lock_key) is None:
+            break
+    return build_page()
+
+
+def store_page(version: int, digest: str, data):
+    ttl = get_catalog_cache_ttl()
+    cache.set(CATALOG_PAGE_KEY.format(version=version, digest=digest), {"expires": time.time() + ttl, "data": data}, timeout=ttl * 2)
+
+
+def cached_catalog_response(request, build_page):
+    """
+    Answer a catalog request from the cache. The ETag names the catalog
+    version and page, so a matching If-None-Match gets 304 without a page
+    lookup or database query.
+    """
+    if get_catalog_cache_ttl() <= 0:
+        return Response(build_page())
+
+    version = get_catalog_version()
+    digest = get_page_digest(request)
+    etag = catalog_etag(version, digest)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = Response(get_cached_page(version, digest, build_page))
+    response["ETag"] = etag
+    response["Cache-Control"] = CATALOG_CACHE_CONTROL
+    return response
+
+
+def get_rows_per_category() -> int:
+    return getattr(settings, "CATALOG_ROWS_PER_CATEGORY", 10)
+
+
+def build_category_rows() -> list:
+    """
+    The newest videos of every category from one window-function query,
+    serialized with relative URLs. Rows are ordered by their newest video.
+    """
+    rows = {}
+    for video in list_category_rows_queryset(get_rows_per_category()):
+        rows.setdefault(video.category, []).append(video)
+
+    return [
+        {"category": category, "videos": VideoListSerializer(videos, many=True).data}
+        for category, videos in sorted(rows.items(), key=lambda item: (item[1][0].created_at, item[1][0].id), reverse=True)
+    ]
+
+
+def materialize_category_rows(version: int):
+    """Store the rows snapshot of a catalog version, so no request has to build it."""
+    if get_catalog_cache_ttl() > 0 and version == get_catalog_version():
+        store_page(version, CATEGORY_ROWS_DIGEST, build_category_rows())
+
+
+def category_rows_response(request):
+    """
+    Serve the rows snapshot of the current catalog version, with absolute
+    URLs for this host. ETag and 304 work as for catalog pages.
+    """
+    if get_catalog_cache_ttl() <= 0:
+        return Response({"rows": absolutize_rows(build_category_rows(), request)})
+
+    version = get_catalog_version()
+    etag = catalog_etag(version, hashlib.sha1(f"{request.scheme}://{request.get_host()}/rows".encode()).hexdigest())
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        rows = get_cached_page(version, CATEGORY_ROWS_DIGEST, build_category_rows)
+        response = Response({"rows": absolutize_rows(rows, request)})
+    response["ETag"] = etag
+    response["Cache-Control"] = CATALOG_CACHE_CONTROL
+    return response
+
+
+def absolutize_rows(rows: list, request) -> list:
+    return [{"category": row["category"], "videos": [absolute_video_urls(video, request) for video in row["videos"]]} for row in rows]
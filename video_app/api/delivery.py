@@ -0,0 +1,315 @@
+"""File delivery helpers for HLS files: byte ranges, or offloading the transfer to the front proxy."""
+import asyncio, base64, os, re
+
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from .hotcache import read_hot_file
+from .playlists import rewrite_playlist_uris
+from .signing import SEGMENT_TOKEN_PARAM, signed_urls_enabled
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+BLOCK_SIZE = 64 * 1024
+# One buffer per concurrent async stream, each block read is a thread pool hop
+ASYNC_BLOCK_SIZE = 64 * 1024
+
+DELIVERY_DJANGO = "django"
+DELIVERY_X_ACCEL = "x-accel"
+DELIVERY_X_SENDFILE = "x-sendfile"
+
+PLAYLIST_CONTENT_TYPE = "application/vnd.apple.mpegurl"
+
+# Finished segments never change; playlists (EVENT), trickplay files and
+# thumbnails can be rewritten under the same name and are revalidated.
+SEGMENT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+PLAYLIST_CACHE_CONTROL = "private, no-cache"
+IMMUTABLE_SUFFIXES = {".ts", ".m4s", ".mp4", ".aac"}
+
+SEGMENT_CONTENT_TYPES = {
+    ".ts": "video/MP2T",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+    ".aac": "audio/aac",
+    ".webp": "image/webp",
+    ".vtt": "text/vtt",
+}
+
+
+def get_segment_content_type(path: Path) -> str:
+    """Return the MIME type for a segment, init section, single-file rendition or trickplay file."""
+    return SEGMENT_CONTENT_TYPES.get(Path(path).suffix.lower(), "application/octet-stream")
+
+
+def parse_range_header(header: str, size: int):
+    """
+    Return (start, end) for a single "bytes=" range, None when the header
+    should be ignored, or False when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def iter_file_range(path: Path, start: int, length: int):
+    """Yield `length` bytes of the file starting at `start` in blocks."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_etag(stat) -> str:
+    """
+    Strong ETag from modification time and size, in nginx's format, so
+    in-process and offloaded delivery announce the same validator.
+    """
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def if_range_matches(request, etag: str, last_modified: int) -> bool:
+    """Whether a Range request may be answered partially (RFC 9110 If-Range)."""
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+async def aiter_file_range(path: Path, start: int, length: int):
+    """
+    Async variant of iter_file_range: reads run in the thread pool, and the
+    next block is only read after the ASGI server has sent the previous one.
+    """
+    f = await asyncio.to_thread(open, path, "rb")
+    try:
+        await asyncio.to_thread(f.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(ASYNC_BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+def get_delivery_mode() -> str:
+    return getattr(settings, "HLS_DELIVERY_MODE", DELIVERY_DJANGO)
+
+
+def offload_response(path: Path, content_type: str, mode: str) -> HttpResponse:
+    """
+    Empty response whose header tells the front proxy which file to send.
+    The proxy answers Range requests itself.
+    """
+    response = HttpResponse(content_type=content_type)
+    if mode == DELIVERY_X_ACCEL:
+        prefix = getattr(settings, "HLS_ACCEL_REDIRECT_PREFIX", "/protected-media/").rstrip("/")
+        relative = Path(path).resolve().relative_to(Path(settings.MEDIA_ROOT).resolve())
+        response["X-Accel-Redirect"] = quote(f"{prefix}/{relative.as_posix()}")
+    else:
+        response["X-Sendfile"] = str(Path(path).resolve())
+    return response
+
+
+def file_response(request, path: Path, filename: str, content_type: str, cache_control: str, stat=None):
+    """
+    Serve a file in the configured delivery mode with ETag/Last-Modified
+    validators, 304 Not Modified and 206 Partial Content for Range requests.
+    `stat` comes from the segment manifest and saves the stat call.
+    """
+    path = Path(path)
+    stat = stat or path.stat()
+    etag, last_modified = file_etag(stat), int(stat.st_mtime)
+    mode = get_delivery_mode()
+
+    # Also answered here in offloaded mode, so revalidations never reach the proxy's file transfer
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        offloaded = mode in (DELIVERY_X_ACCEL, DELIVERY_X_SENDFILE)
+        # Offloaded playlists still pass through the cache, a miss warms the leading segments
+        data = read_hot_file(path, stat) if not offloaded or content_type == PLAYLIST_CONTENT_TYPE else None
+        if offloaded:
+            response = offload_response(path, content_type, mode)
+        else:
+            response = range_response(request, path, content_type, stat.st_size, if_range_matches(request, etag, last_modified), data)
+        response["Accept-Ranges"] = "bytes"
+        response["Content-Disposition"] = f"inline; filename={filename}"
+        set_digest(response, stat)
+
+    return set_validators(response, etag, last_modified, cache_control)
+
+
+async def afile_response(request, path: Path, filename: str, content_type: str, cache_control: str, stat=None):
+    """file_response for async views: stat, cache fill and file reads do not block the event loop."""
+    path = Path(path)
+    stat = stat or await asyncio.to_thread(os.stat, path)
+    etag, last_modified = file_etag(stat), int(stat.st_mtime)
+    mode = get_delivery_mode()
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        offloaded = mode in (DELIVERY_X_ACCEL, DELIVERY_X_SENDFILE)
+        data = None
+        if not offloaded or content_type == PLAYLIST_CONTENT_TYPE:
+            data = await asyncio.to_thread(read_hot_file, path, stat)
+        if offloaded:
+            response = offload_response(path, content_type, mode)
+        else:
+            response = range_response(
+                request, path, content_type, stat.st_size, if_range_matches(request, etag, last_modified), data,
+                iter_range=aiter_file_range,
+            )
+        response["Accept-Ranges"] = "bytes"
+        response["Content-Disposition"] = f"inline; filename={filename}"
+        set_digest(response, stat)
+
+    return set_validators(response, etag, last_modified, cache_control)
+
+
+def set_digest(response, stat):
+    """Repr-Digest (RFC 9530) of the whole file, if the manifest knows its checksum."""
+    checksum = getattr(stat, "sha256", None)
+    if checksum and response.status_code in (200, 206):
+        response["Repr-Digest"] = f"sha-256=:{base64.b64encode(bytes.fromhex(checksum)).decode()}:"
+
+
+def set_validators(response, etag: str, last_modified: int, cache_control: str):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = cache_control
+    return response
+
+
+def range_response(request, path: Path, content_type: str, size: int, allow_range: bool = True, data: bytes = None, iter_range=None):
+    """
+    Send the file in-process, or only the requested byte range. `data` is the
+    content from the hot cache; iter_range streams from disk (aiter_file_range
+    under ASGI, FileResponse / iter_file_range otherwise).
+    """
+    byte_range = parse_range_header(request.META.get("HTTP_RANGE", ""), size) if allow_range else None
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif byte_range is None:
+        if data is not None:
+            response = HttpResponse(data, content_type=content_type)
+        elif iter_range is not None:
+            response = StreamingHttpResponse(iter_range(path, 0, size), content_type=content_type)
+            response["Content-Length"] = str(size)
+        else:
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        if data is not None:
+            response = HttpResponse(data[start:end + 1], status=206, content_type=content_type)
+        else:
+            response = StreamingHttpResponse((iter_range or iter_file_range)(path, start, length), status=206, content_type=content_type)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(length)
+    return response
+
+
+def get_segment_cache_control(path: Path) -> str:
+    if Path(path).suffix.lower() in IMMUTABLE_SUFFIXES:
+        return getattr(settings, "HLS_SEGMENT_CACHE_CONTROL", SEGMENT_CACHE_CONTROL)
+    return getattr(settings, "HLS_PLAYLIST_CACHE_CONTROL", PLAYLIST_CACHE_CONTROL)
+
+
+def get_playlist_cache_control() -> str:
+    return getattr(settings, "HLS_PLAYLIST_CACHE_CONTROL", PLAYLIST_CACHE_CONTROL)
+
+
+def segment_response(request, path: Path, filename: str, stat=None):
+    """Serve a segment, init section, single-file rendition or trickplay file."""
+    return file_response(request, path, filename, get_segment_content_type(path), get_segment_cache_control(path), stat)
+
+
+def get_cdn_base_url() -> str:
+    return getattr(settings, "HLS_CDN_BASE_URL", "").rstrip("/")
+
+
+def playlist_needs_rewrite() -> bool:
+    """Playlists are rendered per request when URIs carry tokens or point to a CDN."""
+    return signed_urls_enabled() or bool(get_cdn_base_url())
+
+
+def make_uri_rewriter(video_id: int, rendition: str = None, token_for=None):
+    """
+    Build rewrite(uri) for rewrite_playlist_uris. Master playlist URIs (rendition
+    None) look like "<rendition>/index.m3u8", media playlist URIs are segment
+    names. token_for(rendition) returns the signed token to append, if any.
+    """
+    cdn_base = get_cdn_base_url()
+
+    def rewrite(uri: str) -> str:
+        path = uri.partition("?")[0]
+        if "://" in path:
+            return uri
+        if rendition is None:
+            target, relative = path.split("/", 1)[0], path
+        elif "/" in path:
+            return uri
+        else:
+            # Trailing slash matches the segment route, players skip the APPEND_SLASH redirect
+            target, relative = rendition, f"{path}/"
+
+        if cdn_base:
+            relative = f"{cdn_base}/video/{video_id}/" + (relative if rendition is None else f"{rendition}/{relative}")
+        token = token_for(target) if token_for else None
+        return f"{relative}?{SEGMENT_TOKEN_PARAM}={token}" if token else relative
+
+    return rewrite
+
+
+def read_playlist_text(path: Path) -> str:
+    data = read_hot_file(path)
+    return data.decode("utf-8") if data is not None else Path(path).read_text(encoding="utf-8")
+
+
+def rewritten_playlist_response(path: Path, rewrite_uri, filename: str = "index.m3u8", text: str = None):
+    """
+    Serve a playlist whose URIs are rewritten per request (signed or CDN URLs).
+    The body differs per viewer and carries expiring tokens, so it is not cached.
+    Async views pass the already read `text`.
+    """
+    text = rewrite_playlist_uris(read_playlist_text(path) if text is None else text, rewrite_uri)
+    response = HttpResponse(text, content_type=PLAYLIST_CONTENT_TYPE)
+    response["Content-Disposition"] = f"inline; filename={filename}"
+    response["Cache-Control"] = "private, no-store"
+    return response
+
+
+def playlist_response(request, path: Path, filename: str = "index.m3u8", stat=None):
+    """Serve an HLS playlist, revalidated by the client on every reload."""
+    return file_response(request, path, filename, PLAYLIST_CONTENT_TYPE, get_playlist_cache_control(), stat)
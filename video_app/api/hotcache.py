@@ -0,0 +1,145 @@
+"""In-process LRU cache for playlists and the leading segments of each rendition."""
+import os, re, threading
+
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+
+
+SEGMENT_NAME_RE = re.compile(r"^seg_(\d+)\.(ts|m4s)$")
+# init.mp4, init_<stream>.mp4 with var_stream_map, plus _<chunk> after stitching
+INIT_SECTION_RE = re.compile(r"^init(_\d+)*\.mp4$")
+
+
+class HotCache:
+    """
+    Size-bounded LRU of file contents keyed by path. Entries remember the
+    mtime and size they were read at and are dropped when the file changes;
+    that check is the only invalidation, so it works across worker processes.
+    """
+
+    def __init__(self, max_bytes: int, max_item_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def read(self, path: Path, stat=None, on_miss=None):
+        """
+        Return the file's bytes from the cache or disk, or None if it is not
+        cacheable. on_miss(data) runs after a file was loaded from disk.
+        """
+        stat = stat or os.stat(path)
+        if self.max_bytes <= 0 or stat.st_size > self.max_item_bytes:
+            return None
+
+        key = str(path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == stat.st_mtime_ns and len(entry[1]) == stat.st_size:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self.discard(key)
+                self.invalidations += 1
+            self.misses += 1
+
+        with open(path, "rb") as f:
+            data = f.read()
+        # Replaced between stat and read: serve it, but do not cache a mismatched entry
+        if len(data) == stat.st_size:
+            self.put(key, stat.st_mtime_ns, data)
+        if on_miss is not None:
+            on_miss(data)
+        return data
+
+    def put(self, key: str, mtime_ns: int, data: bytes):
+        with self.lock:
+            if key in self.entries:
+                self.discard(key)
+            self.entries[key] = (mtime_ns, data)
+            self.size += len(data)
+            while self.size > self.max_bytes and self.entries:
+                self.discard(next(iter(self.entries)))
+                self.evictions += 1
+
+    def discard(self, key: str):
+        _, data = self.entries.pop(key)
+        self.size -= len(data)
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "pid": os.getpid(),
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+_hot_cache = None
+
+
+def get_hot_cache() -> HotCache:
+    global _hot_cache
+    if _hot_cache is None:
+        max_bytes = getattr(settings, "HLS_HOT_CACHE_MB", 64) * 1024 * 1024
+        max_item_bytes = getattr(settings, "HLS_HOT_CACHE_MAX_ITEM_MB", 8) * 1024 * 1024
+        _hot_cache = HotCache(max_bytes, max_item_bytes)
+    return _hot_cache
+
+
+def is_hot_file(path: Path) -> bool:
+    """Playlists, init sections and the first HLS_HOT_CACHE_SEGMENTS segments of a rendition."""
+    name = Path(path).name
+    if name.endswith(".m3u8") or INIT_SECTION_RE.match(name):
+        return True
+    match = SEGMENT_NAME_RE.match(name)
+    return bool(match) and int(match.group(1)) < getattr(settings, "HLS_HOT_CACHE_SEGMENTS", 3)
+
+
+def read_hot_file(path: Path, stat=None):
+    """Cached bytes of a hot file, or None when it should be streamed from disk."""
+    if not is_hot_file(path):
+        return None
+    on_miss = None
+    if Path(path).suffix == ".m3u8":
+        on_miss = lambda data: warm_page_cache(path, data.decode("utf-8", errors="replace"))
+    return get_hot_cache().read(path, stat, on_miss)
+
+
+def warm_page_cache(playlist_path: Path, playlist_text: str):
+    """
+    Ask the kernel to read ahead the leading segments of a playlist, so the
+    first segment requests (in-process or from the front proxy) hit memory.
+    """
+    if not getattr(settings, "HLS_HOT_CACHE_WARM", False) or not hasattr(os, "posix_fadvise"):
+        return
+
+    count = getattr(settings, "HLS_HOT_CACHE_SEGMENTS", 3)
+    names = []
+    for line in playlist_text.splitlines():
+        if line and not line.startswith("#") and line not in names:
+            names.append(line)
+        if len(names) >= count:
+            break
+
+    for name in names:
+        try:
+            fd = os.open(Path(playlist_path).parent / name, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
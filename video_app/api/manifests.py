@@ -0,0 +1,198 @@
+"""Per-rendition segment manifests: file sizes, validators and checksums without stat calls."""
+import asyncio, hashlib, json, os, threading, time, django_rq
+
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+from django.conf import settings
+
+from .playlists import parse_media_playlist
+from .utils import get_hls_variant_dir
+
+
+SEGMENT_MANIFEST_NAME = "segments.json"
+SEGMENT_MANIFEST_VERSION = 1
+MANIFEST_KEY = "hls-manifest:{video_id}"
+MANIFEST_BLOCK_SIZE = 1024 * 1024
+MANIFEST_CACHE_SIZE = 512
+
+# Stand-in for os.stat_result, enough for ETag, Last-Modified, Range and the hot cache
+ManifestStat = namedtuple("ManifestStat", "st_size st_mtime st_mtime_ns sha256")
+
+# (video id, rendition) -> (loaded at, manifest or None) of this process
+_manifests = OrderedDict()
+_manifests_lock = threading.Lock()
+
+
+def get_manifest_key(video_id: int) -> str:
+    return MANIFEST_KEY.format(video_id=video_id)
+
+
+def get_manifest_path(video_id: int, rendition: str) -> Path:
+    return get_hls_variant_dir(video_id, rendition) / SEGMENT_MANIFEST_NAME
+
+
+def file_checksum(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(MANIFEST_BLOCK_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def build_segment_manifest(variant_dir: Path) -> dict:
+    """
+    Describe a finished rendition: every file the playlist references (plus
+    the playlist itself) with size, mtime and SHA-256, and every segment with
+    duration, start time and byte offset/length within its file.
+    """
+    playlist_path = variant_dir / "index.m3u8"
+    segments = parse_media_playlist(playlist_path)
+
+    names = ["index.m3u8"]
+    for segment in segments:
+        for uri in (segment["map"]["uri"] if segment["map"] else None, segment["uri"]):
+            if uri and uri not in names:
+                names.append(uri)
+
+    files = {}
+    for name in names:
+        stat = os.stat(variant_dir / name)
+        files[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_checksum(variant_dir / name)}
+
+    entries = []
+    start = 0.0
+    for segment in segments:
+        length, offset = segment["byterange"] or (files[segment["uri"]]["size"], 0)
+        entries.append({
+            "uri": segment["uri"],
+            "duration": segment["duration"],
+            "start": round(start, 6),
+            "offset": offset,
+            "length": length,
+        })
+        start += segment["duration"]
+
+    return {
+        "version": SEGMENT_MANIFEST_VERSION,
+        "rendition": variant_dir.name,
+        "duration": round(start, 6),
+        "files": files,
+        "segments": entries,
+    }
+
+
+def is_manifest_current(variant_dir: Path) -> bool:
+    """A manifest written after the playlist's last change is up to date."""
+    try:
+        return (variant_dir / SEGMENT_MANIFEST_NAME).stat().st_mtime_ns >= (variant_dir / "index.m3u8").stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def write_segment_manifest(video_id: int, variant_dir: Path, connection=None) -> dict:
+    """Write segments.json next to the playlist and publish it to Redis."""
+    manifest = build_segment_manifest(variant_dir)
+    data = json.dumps(manifest, separators=(",", ":"))
+
+    manifest_path = variant_dir / SEGMENT_MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix(".json.tmp")
+    tmp_path.write_text(data, encoding="utf-8")
+    os.replace(tmp_path, manifest_path)
+
+    connection = connection or django_rq.get_connection("default")
+    connection.hset(get_manifest_key(video_id), variant_dir.name, data)
+    forget_manifest(video_id, variant_dir.name)
+    return manifest
+
+
+def load_segment_manifest(video_id: int, rendition: str, connection=None):
+    """Manifest from Redis, else from segments.json (and back into Redis), else None."""
+    connection = connection or django_rq.get_connection("default")
+    data = connection.hget(get_manifest_key(video_id), rendition)
+    if data is None:
+        try:
+            data = get_manifest_path(video_id, rendition).read_text(encoding="utf-8")
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        connection.hset(get_manifest_key(video_id), rendition, data)
+
+    manifest = json.loads(data)
+    return manifest if manifest.get("version") == SEGMENT_MANIFEST_VERSION else None
+
+
+def get_cached_manifest(key: tuple):
+    """(True, manifest) if this process holds a fresh copy, else (False, None)."""
+    ttl = getattr(settings, "HLS_SEGMENT_MANIFEST_TTL", 60)
+    with _manifests_lock:
+        cached = _manifests.get(key)
+        if cached is None or time.monotonic() - cached[0] > ttl:
+            return False, None
+        _manifests.move_to_end(key)
+        return True, cached[1]
+
+
+def remember_manifest(key: tuple, manifest):
+    with _manifests_lock:
+        _manifests[key] = (time.monotonic(), manifest)
+        _manifests.move_to_end(key)
+        while len(_manifests) > MANIFEST_CACHE_SIZE:
+            _manifests.popitem(last=False)
+
+
+def get_segment_manifest(video_id: int, rendition: str):
+    """
+    In-process copy of a rendition's manifest, refreshed from Redis after
+    HLS_SEGMENT_MANIFEST_TTL seconds. None while the rendition has none
+    (old videos, renditions still being encoded).
+    """
+    key = (int(video_id), rendition)
+    found, manifest = get_cached_manifest(key)
+    if not found:
+        manifest = load_segment_manifest(video_id, rendition)
+        remember_manifest(key, manifest)
+    return manifest
+
+
+async def aget_segment_manifest(video_id: int, rendition: str):
+    """get_segment_manifest for async views, Redis and disk reads run in the thread pool."""
+    key = (int(video_id), rendition)
+    found, manifest = get_cached_manifest(key)
+    if not found:
+        manifest = await asyncio.to_thread(load_segment_manifest, video_id, rendition)
+        remember_manifest(key, manifest)
+    return manifest
+
+
+def manifest_stat(manifest, name: str):
+    """
+    Attributes of `name` from the manifest. None without a manifest (the
+    caller stats the file); FileNotFoundError if the manifest does not list it.
+    """
+    if manifest is None:
+        return None
+    entry = manifest["files"].get(name)
+    if entry is None:
+        raise FileNotFoundError(name)
+    return ManifestStat(entry["size"], entry["mtime_ns"] / 1e9, entry["mtime_ns"], entry["sha256"])
+
+
+def get_manifest_stat(video_id: int, rendition: str, name: str):
+    return manifest_stat(get_segment_manifest(video_id, rendition), name)
+
+
+async def aget_manifest_stat(video_id: int, rendition: str, name: str):
+    return manifest_stat(await aget_segment_manifest(video_id, rendition), name)
+
+
+def forget_manifest(video_id: int, rendition: str = None):
+    """Drop this process's copies of a video's manifests."""
+    with _manifests_lock:
+        for key in [key for key in _manifests if key[0] == int(video_id) and rendition in (None, key[1])]:
+            del _manifests[key]
+
+
+def delete_segment_manifests(video_id: int, connection=None):
+    forget_manifest(video_id)
+    connection = connection or django_rq.get_connection("default")
+    connection.delete(get_manifest_key(video_id))
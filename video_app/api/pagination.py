@@ -0,0 +1,110 @@
+"""Keyset (cursor) pagination for the video catalog."""
+import base64, binascii
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class VideoCursorPagination(BasePagination):
+    """
+    Pages ordered by (created_at, id), newest first. The cursor holds the
+    (created_at, id) of the last row on the page, so every page is one index
+    range scan on the composite index, however deep the client scrolls.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request) -> int:
+        page_size = getattr(settings, "VIDEO_LIST_PAGE_SIZE", 24)
+        max_page_size = getattr(settings, "VIDEO_LIST_MAX_PAGE_SIZE", 100)
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        return min(requested, max_page_size) if requested > 0 else page_size
+
+    def encode_cursor(self, obj, reverse: bool = False) -> str:
+        value = f"{obj.created_at.isoformat()}|{obj.id}|{int(reverse)}"
+        return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        """Return (created_at, id, reverse) from the cursor parameter, or None on the first page."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode()
+            created_at, pk, reverse = value.split("|")
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError(value)
+            return created_at, int(pk), reverse == "1"
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[2]
+
+        page = list(self.get_page_queryset(queryset, cursor))
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+
+        if reverse:
+            page.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = cursor is not None, has_more
+        self.page = page
+        return page
+
+    def get_page_queryset(self, queryset, cursor):
+        """Rows after (or, for a reverse cursor, before) the cursor, plus one to tell whether more follow."""
+        if cursor is None:
+            return queryset.order_by("-created_at", "-id")[:self.page_size + 1]
+
+        created_at, pk, reverse = cursor
+        # created_at <= x is the index range, the OR only breaks ties on equal timestamps
+        if reverse:
+            queryset = queryset.filter(Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(id__gt=pk)))
+            return queryset.order_by("created_at", "id")[:self.page_size + 1]
+        queryset = queryset.filter(Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=pk)))
+        return queryset.order_by("-created_at", "-id")[:self.page_size + 1]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        cursor = self.encode_cursor(self.page[0], reverse=True)
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
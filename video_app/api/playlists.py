@@ -0,0 +1,143 @@
+import math, re
+
+from pathlib import Path
+
+
+ATTRIBUTE_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+def parse_attributes(value: str) -> dict:
+    """Parse an HLS attribute list like URI="init.mp4",BYTERANGE="720@0"."""
+    return {key: val.strip('"') for key, val in ATTRIBUTE_RE.findall(value)}
+
+
+def parse_byterange(value: str, default_offset: int = 0) -> tuple:
+    """Return (length, offset) for an EXT-X-BYTERANGE value "<n>[@<o>]"."""
+    length, _, offset = value.partition("@")
+    return int(length), int(offset) if offset else default_offset
+
+
+def format_byterange(byterange: tuple) -> str:
+    return f"{byterange[0]}@{byterange[1]}"
+
+
+def parse_media_playlist(playlist_path: Path) -> list:
+    """
+    Return the segments of an HLS media playlist as dicts with duration, uri,
+    discontinuity, byterange ((length, offset) or None) and map (init section
+    dict with uri and byterange, or None).
+    """
+    segments = []
+    duration = None
+    discontinuity = False
+    byterange = None
+    init_map = None
+    next_offsets = {}
+
+    for line in Path(playlist_path).read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+        elif line == "#EXT-X-DISCONTINUITY":
+            discontinuity = True
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            byterange = line[len("#EXT-X-BYTERANGE:"):]
+        elif line.startswith("#EXT-X-MAP:"):
+            attributes = parse_attributes(line[len("#EXT-X-MAP:"):])
+            init_map = {
+                "uri": attributes["URI"],
+                "byterange": parse_byterange(attributes["BYTERANGE"]) if "BYTERANGE" in attributes else None,
+            }
+        elif not line.startswith("#"):
+            segment_range = None
+            if byterange:
+                segment_range = parse_byterange(byterange, next_offsets.get(line, 0))
+                next_offsets[line] = segment_range[0] + segment_range[1]
+
+            segments.append({
+                "duration": duration or 0.0,
+                "uri": line,
+                "discontinuity": discontinuity,
+                "byterange": segment_range,
+                "map": init_map,
+            })
+            duration = None
+            discontinuity = False
+            byterange = None
+
+    return segments
+
+
+def write_media_playlist(playlist_path: Path, segments: list, playlist_type: str = "VOD", media_sequence: int = 0, endlist: bool = True):
+    """Write an HLS media playlist for the given segment dicts."""
+    target_duration = max((math.ceil(s["duration"]) for s in segments), default=0)
+
+    if any(s.get("map") for s in segments):
+        version = 7
+    elif any(s.get("byterange") for s in segments):
+        version = 4
+    else:
+        version = 3
+
+    lines = [
+        "#EXTM3U",
+        f"#EXT-X-VERSION:{version}",
+        f"#EXT-X-TARGETDURATION:{target_duration}",
+        f"#EXT-X-MEDIA-SEQUENCE:{media_sequence}",
+        f"#EXT-X-PLAYLIST-TYPE:{playlist_type}",
+    ]
+
+    current_map = None
+    for s in segments:
+        if s.get("discontinuity"):
+            lines.append("#EXT-X-DISCONTINUITY")
+        if s.get("map") and s["map"] != current_map:
+            current_map = s["map"]
+            map_line = f'#EXT-X-MAP:URI="{current_map["uri"]}"'
+            if current_map.get("byterange"):
+                map_line += f',BYTERANGE="{format_byterange(current_map["byterange"])}"'
+            lines.append(map_line)
+        lines.append(f"#EXTINF:{s['duration']:.6f},")
+        if s.get("byterange"):
+            lines.append(f"#EXT-X-BYTERANGE:{format_byterange(s['byterange'])}")
+        lines.append(s["uri"])
+
+    if endlist:
+        lines.append("#EXT-X-ENDLIST")
+
+    tmp_path = Path(playlist_path).with_suffix(".m3u8.tmp")
+    tmp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    tmp_path.replace(playlist_path)
+    return str(playlist_path)
+
+
+def finalize_event_playlist(playlist_path: Path):
+    """Switch a finished EVENT playlist to VOD so players treat it as complete."""
+    playlist_path = Path(playlist_path)
+    text = playlist_path.read_text(encoding="utf-8")
+    text = text.replace("#EXT-X-PLAYLIST-TYPE:EVENT", "#EXT-X-PLAYLIST-TYPE:VOD")
+    if "#EXT-X-ENDLIST" not in text:
+        text = text.rstrip("\n") + "\n#EXT-X-ENDLIST\n"
+
+    tmp_path = playlist_path.with_suffix(".m3u8.tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    tmp_path.replace(playlist_path)
+    return str(playlist_path)
+
+
+URI_ATTRIBUTE_RE = re.compile(r'URI="([^"]*)"')
+
+
+def rewrite_playlist_uris(text: str, rewrite) -> str:
+    """Pass every URI of a playlist (URI lines and URI="..." attributes) through rewrite(uri)."""
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped and not stripped.startswith("#"):
+            line = rewrite(stripped)
+        elif stripped.startswith("#") and 'URI="' in stripped:
+            line = URI_ATTRIBUTE_RE.sub(lambda match: f'URI="{rewrite(match.group(1))}"', line)
+        lines.append(line)
+    return "\n".join(lines) + "\n"
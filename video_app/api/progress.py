@@ -0,0 +1,89 @@
+"""Live ffmpeg progress of running transcoding jobs, published to Redis."""
+import json, time, django_rq
+
+from rq import get_current_job
+
+from ..models import Video
+
+
+PROGRESS_KEY = "video-progress:{video_id}"
+PROGRESS_TTL = 24 * 60 * 60
+
+
+def get_progress_key(video_id: int) -> str:
+    return PROGRESS_KEY.format(video_id=video_id)
+
+
+class ProgressReporter:
+    """Writes ffmpeg -progress blocks of one RQ job into the video's progress hash."""
+
+    def __init__(self, connection, video_id: int, job_id: str, job_name: str, duration: float = None, **labels):
+        self.connection = connection
+        self.key = get_progress_key(video_id)
+        self.job_id = job_id
+        self.job_name = job_name
+        self.duration = duration
+        self.labels = labels
+
+    @classmethod
+    def for_current_job(cls):
+        """Reporter for the running RQ job, or None outside of a video processing job."""
+        job = get_current_job()
+        video_id = job.kwargs.get("video_id") if job else None
+        if not video_id:
+            return None
+
+        start = job.kwargs.get("start") or 0
+        duration = job.kwargs.get("duration")
+        if not duration:
+            total = Video.objects.filter(id=video_id).values_list("duration", flat=True).first()
+            duration = total - start if total else None
+
+        labels = {key: job.kwargs[key] for key in ("variant_name", "chunk_index") if key in job.kwargs}
+        return cls(job.connection, video_id, job.id, job.func_name.rsplit(".", 1)[-1], duration, **labels)
+
+    def publish(self, block: dict):
+        out_time = parse_out_time(block)
+        entry = {
+            "job": self.job_name,
+            **self.labels,
+            "out_time": out_time,
+            "percent": round(min(out_time / self.duration * 100, 100), 1) if self.duration else None,
+            "fps": parse_float(block.get("fps")),
+            "speed": parse_float(block.get("speed", "").rstrip("x")),
+            "state": "finished" if block.get("progress") == "end" else "running",
+            "updated_at": time.time(),
+        }
+        pipe = self.connection.pipeline()
+        pipe.hset(self.key, self.job_id, json.dumps(entry))
+        pipe.expire(self.key, PROGRESS_TTL)
+        pipe.execute()
+
+
+def parse_out_time(block: dict) -> float:
+    # ffmpeg reports out_time_ms in microseconds as well, despite the name
+    micros = block.get("out_time_us") or block.get("out_time_ms")
+    try:
+        return max(int(micros), 0) / 1_000_000
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_video_progress(video_id: int, connection=None) -> list:
+    """Return the latest progress entry of every job that worked on the video."""
+    connection = connection or django_rq.get_connection("default")
+    entries = connection.hgetall(get_progress_key(video_id))
+    progress = [dict(json.loads(value), job_id=job_id.decode()) for job_id, value in entries.items()]
+    return sorted(progress, key=lambda entry: entry["updated_at"])
+
+
+def clear_video_progress(video_id: int, connection=None):
+    connection = connection or django_rq.get_connection("default")
+    connection.delete(get_progress_key(video_id))
@@ -0,0 +1,145 @@
+"""Transcode queues, CPU/memory admission control and queue metrics."""
+import os, json, time, socket, django_rq
+
+from contextlib import contextmanager
+from datetime import timezone
+
+from django.conf import settings
+from redis.exceptions import WatchError
+from rq import get_current_job
+from rq.registry import StartedJobRegistry
+
+
+TRANSCODE_QUEUE = "transcode"
+TRANSCODE_QUEUE_HIGH = "transcode_high"
+TRANSCODE_QUEUES = [TRANSCODE_QUEUE_HIGH, TRANSCODE_QUEUE]
+
+SLOTS_KEY = "transcode:slots:{host}"
+WAITS_KEY = "transcode:waits:{queue}"
+WAIT_SAMPLES = 100
+
+
+def get_transcode_queue(high_priority: bool = False):
+    name = TRANSCODE_QUEUE_HIGH if high_priority else TRANSCODE_QUEUE
+    return django_rq.get_queue(name, autocommit=True)
+
+
+def is_priority_video(video) -> bool:
+    """Short videos jump ahead of long ones. Unprobed uploads count as short."""
+    max_seconds = getattr(settings, "TRANSCODE_PRIORITY_MAX_SECONDS", 600)
+    return not video.duration or video.duration <= max_seconds
+
+
+def get_cpu_budget() -> int:
+    return getattr(settings, "TRANSCODE_CPU_BUDGET", None) or os.cpu_count() or 1
+
+
+def get_encode_threads() -> int:
+    """ffmpeg threads per encode job, so that all transcode workers together fill the CPU budget."""
+    workers = max(1, getattr(settings, "TRANSCODE_WORKERS", 2))
+    return max(1, get_cpu_budget() // workers)
+
+
+def get_available_memory_mb():
+    """MemAvailable from /proc/meminfo, or None where it cannot be read."""
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def try_reserve_cores(connection, key: str, member: str, cores: int, ttl: int) -> bool:
+    """
+    Atomically reserve `cores` on this host if they fit into the CPU budget.
+    Reservations expire after `ttl` seconds, so a killed worker cannot leak them.
+    """
+    now = time.time()
+    with connection.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(key)
+                pipe.zremrangebyscore(key, "-inf", now)
+                reserved = sum(json.loads(m)["cores"] for m in pipe.zrange(key, 0, -1))
+                # A job larger than the whole budget still runs, just alone
+                if reserved + cores > get_cpu_budget() and reserved > 0:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.zadd(key, {member: now + ttl})
+                pipe.execute()
+                return True
+            except WatchError:
+                continue
+
+
+@contextmanager
+def encode_slot(cores: int = None):
+    """
+    Admission control for one encode: wait until this host has `cores` free in
+    its CPU budget and enough available memory, then hold the reservation while
+    ffmpeg runs. Outside of an RQ job the encode runs immediately.
+    """
+    job = get_current_job()
+    if job is None:
+        yield
+        return
+
+    cores = cores or get_encode_threads()
+    min_memory = getattr(settings, "TRANSCODE_MEMORY_PER_JOB_MB", 1024)
+    poll_interval = getattr(settings, "TRANSCODE_ADMISSION_POLL_SECONDS", 2)
+    key = SLOTS_KEY.format(host=socket.gethostname())
+    member = json.dumps({"job": job.id, "cores": cores})
+    ttl = job.timeout if job.timeout and job.timeout > 0 else 24 * 60 * 60
+
+    while True:
+        available = get_available_memory_mb()
+        if (available is None or available >= min_memory) and try_reserve_cores(job.connection, key, member, cores, ttl):
+            break
+        time.sleep(poll_interval)
+
+    record_wait(job)
+    try:
+        yield
+    finally:
+        job.connection.zrem(key, member)
+
+
+def record_wait(job):
+    """Keep the latest queue + admission wait times per queue for the metrics endpoint."""
+    if not job.enqueued_at:
+        return
+    key = WAITS_KEY.format(queue=job.origin)
+    pipe = job.connection.pipeline()
+    pipe.lpush(key, round(time.time() - as_timestamp(job.enqueued_at), 3))
+    pipe.ltrim(key, 0, WAIT_SAMPLES - 1)
+    pipe.execute()
+
+
+def get_queue_stats() -> list:
+    """Depth, running jobs, oldest waiting job and recent wait times of every transcode queue."""
+    stats = []
+    now = time.time()
+    for name in TRANSCODE_QUEUES:
+        queue = django_rq.get_queue(name)
+        oldest = next(iter(queue.get_jobs(0, 0)), None)
+        waits = [float(w) for w in queue.connection.lrange(WAITS_KEY.format(queue=name), 0, -1)]
+        stats.append({
+            "queue": name,
+            "depth": queue.count,
+            "running": StartedJobRegistry(queue=queue).count,
+            "oldest_wait": round(now - as_timestamp(oldest.enqueued_at), 1) if oldest and oldest.enqueued_at else 0.0,
+            "recent_wait_avg": round(sum(waits) / len(waits), 1) if waits else None,
+            "recent_wait_max": round(max(waits), 1) if waits else None,
+        })
+    return stats
+
+
+def as_timestamp(value) -> float:
+    # Older rq versions store naive UTC datetimes
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
@@ -1,16 +1,28 @@
 """Serializers for video API endpoints."""
+from django.core.files.storage import default_storage
+from django.urls import reverse
 from rest_framework import serializers
 
-from ..models import Video
+from ..models import Video, EncodeStat, VideoUpload
+from .progress import get_video_progress
 
 class VideoListSerializer(serializers.ModelSerializer):
-    """Serializer for video list with thumbnail URL."""
+    """Serializer for video list with thumbnail URLs and seek previews."""
     
     thumbnail_url = serializers.SerializerMethodField()
+    thumbnail_sizes = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
+    trickplay_url = serializers.SerializerMethodField()
+    master_playlist_url = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Video
-        fields = ["id", "created_at", "title", "description", "thumbnail_url", "category"]
+        fields = [
+            "id", "created_at", "title", "description", "thumbnail_url",
+            "thumbnail_sizes", "thumbnail_srcset", "trickplay_url", "category",
+            "master_playlist_url", "renditions",
+        ]
 
     def get_thumbnail_url(self, obj):
         """Generate absolute URL for video thumbnail."""
@@ -21,4 +33,105 @@ class VideoListSerializer(serializers.ModelSerializer):
         if request:
             return request.build_absolute_uri(url)
         return url
-    
+
+    def get_thumbnail_sizes(self, obj):
+        """Return the thumbnail URL per width in pixels."""
+        return {width: self.build_url(default_storage.url(name)) for width, name in obj.thumbnail_sizes.items()}
+
+    def get_thumbnail_srcset(self, obj):
+        """Return the thumbnail sizes as an <img srcset> value."""
+        return format_srcset(self.get_thumbnail_sizes(obj))
+
+    def get_trickplay_url(self, obj):
+        """Return the WebVTT index of the seek preview sprites."""
+        if not obj.has_trickplay:
+            return None
+        return self.build_url(reverse("video-trickplay", kwargs={"movie_id": obj.id}))
+
+    def get_master_playlist_url(self, obj):
+        """Return the adaptive bitrate entry point once a rendition is published."""
+        if not obj.hls_variants:
+            return None
+        return self.build_url(reverse("video-hls-master", kwargs={"movie_id": obj.id}))
+
+    def get_renditions(self, obj):
+        """Return the published video renditions with resolution, bandwidth and playlist URL."""
+        return [
+            {
+                "name": variant["name"],
+                "width": variant.get("width"),
+                "height": variant.get("height"),
+                "bandwidth": variant.get("bandwidth"),
+                "playlist_url": self.build_url(reverse("video-hls-playlist", kwargs={"movie_id": obj.id, "resolution": variant["name"]})),
+            }
+            for variant in obj.hls_variants if variant.get("type") != "audio"
+        ]
+
+    def build_url(self, url):
+        request = self.context.get('request')
+        if request:
+            return request.build_absolute_uri(url)
+        return url
+
+
+def format_srcset(sizes: dict):
+    return ", ".join(f"{url} {width}w" for width, url in sorted(sizes.items(), key=lambda item: int(item[0]))) or None
+
+
+def absolute_video_urls(data: dict, request) -> dict:
+    """Make the URLs of VideoListSerializer data serialized without a request absolute."""
+    build = request.build_absolute_uri
+    data = dict(data)
+    for field in ("thumbnail_url", "trickplay_url", "master_playlist_url"):
+        if data.get(field):
+            data[field] = build(data[field])
+    data["thumbnail_sizes"] = {width: build(url) for width, url in data["thumbnail_sizes"].items()}
+    data["thumbnail_srcset"] = format_srcset(data["thumbnail_sizes"])
+    data["renditions"] = [dict(rendition, playlist_url=build(rendition["playlist_url"])) for rendition in data["renditions"]]
+    return data
+
+
+class EncodeStatSerializer(serializers.ModelSerializer):
+    """Serializer for the resource usage of a finished encode."""
+
+    class Meta:
+        model = EncodeStat
+        fields = ["mode", "chunk_index", "wall_time", "cpu_time", "output_bytes", "created_at"]
+
+
+class VideoStatusSerializer(serializers.ModelSerializer):
+    """Serializer for the processing state and live encode progress of a video."""
+
+    renditions = serializers.SerializerMethodField()
+    progress = serializers.SerializerMethodField()
+    encode_stats = EncodeStatSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Video
+        fields = [
+            "id", "processing_status", "failed_variants", "renditions",
+            "first_playable_at", "time_to_first_playable", "progress", "encode_stats",
+        ]
+
+    def get_renditions(self, obj):
+        """Return the names of the renditions that are published in the master playlist."""
+        return [variant["name"] for variant in obj.hls_variants]
+
+    def get_progress(self, obj):
+        """Return the latest ffmpeg progress of every job that worked on the video."""
+        return get_video_progress(obj.id)
+
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    """Serializer for creating and inspecting a resumable upload."""
+
+    class Meta:
+        model = VideoUpload
+        fields = ["id", "title", "description", "category", "filename", "size", "offset", "video", "created_at"]
+        read_only_fields = ["id", "offset", "video", "created_at"]
+
+    def validate_size(self, value):
+        """Reject empty uploads."""
+        if value <= 0:
+            raise serializers.ValidationError("Upload length must be positive.")
+        return value
@@ -1,9 +1,25 @@
-from ..models import Video
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 
+from ..models import Video, VideoUpload
 
-def list_videos_queryset():
-    return Video.objects.all().order_by('-created_at')
+
+def list_videos_queryset(category: str = None):
+    videos = Video.objects.all()
+    if category:
+        videos = videos.filter(category=category)
+    return videos.order_by('-created_at', '-id')
+
+
+def list_category_rows_queryset(per_category: int):
+    """The newest `per_category` videos of every category, ranked in one window-function query."""
+    rank = Window(RowNumber(), partition_by=[F("category")], order_by=[F("created_at").desc(), F("id").desc()])
+    return Video.objects.annotate(category_rank=rank).filter(category_rank__lte=per_category).order_by("category", "category_rank")
 
 
 def get_video_by_id(video_id: int) -> Video:
-    return Video.objects.get(id=video_id)
\ No newline at end of file
+    return Video.objects.get(id=video_id)
+
+
+def get_upload_by_id(upload_id) -> VideoUpload:
+    return VideoUpload.objects.get(id=upload_id)
@@ -1,41 +1,80 @@
-import os, django_rq, shutil
+import os, shutil
 
+from django.db import transaction
 from django.dispatch import receiver
 from django.conf import settings
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_init, post_save, post_delete, pre_save
 
 from ..models import Video
-from .tasks import process_video_to_hls, generate_thumbnail_for_video
+from .catalog import affects_catalog, bump_catalog_version
+from .manifests import delete_segment_manifests
+from .progress import clear_video_progress
+from .scheduler import get_transcode_queue
+from .tasks import (
+    process_video_to_hls, enqueue_thumbnail_job, enqueue_unique, hls_job_id, previews_in_encode, enqueue_category_rows_job,
+)
+
+@receiver(post_init, sender=Video)
+def video_post_init(sender, instance, **kwargs):
+    """
+    Merkt sich den geladenen Thumbnail-Namen, damit pre_save Änderungen
+    ohne zusätzliche Abfrage erkennt.
+    """
+    remember_thumbnail(instance)
+
 
 @receiver(pre_save, sender=Video)
-def video_pre_save(sender, instance, **kwargs):
+def video_pre_save(sender, instance, update_fields=None, **kwargs):
     """
-    Regeneriert Thumbnail automatisch, wenn es im Admin gelöscht wurde.
+    Erkennt, ob das Thumbnail (z.B. im Admin) gelöscht wurde.
     """
-    if instance.pk:  # Nur bei Updates, nicht bei neuen Videos
-        try:
-            old_instance = Video.objects.get(pk=instance.pk)
-            # Prüfe ob Thumbnail entfernt wurde
-            if old_instance.thumbnail and not instance.thumbnail:
-                print(f"Thumbnail wurde entfernt für Video {instance.id}, regeneriere...")
-                # Direkt synchron regenerieren (läuft vor dem Save)
-                from pathlib import Path
-                if instance.video_file:
-                    generate_thumbnail_for_video(instance, Path(instance.video_file.path))
-        except Video.DoesNotExist:
-            pass
+    if not instance.pk or (update_fields is not None and 'thumbnail' not in update_fields):
+        return
+    if "thumbnail" not in instance.__dict__:
+        # Zurückgestelltes Feld (only/defer) wurde nicht geladen, also nicht geändert
+        return
+    instance._thumbnail_cleared = bool(instance._loaded_thumbnail) and not instance.thumbnail
 
 
 @receiver(post_save, sender=Video)
-def video_post_save(sender, instance, created, **kwargs):
+def video_post_save(sender, instance, created, update_fields=None, **kwargs):
 
     if created:
         print("Video created, queueing processing tasks...")
         print(f"Video ID: {instance.id}, Video Path: {instance.video_file.path}")
 
-        queue = django_rq.get_queue('default', autocommit=True)
-        queue.enqueue(process_video_to_hls, video_id=instance.id)
-        queue.enqueue(generate_thumbnail_for_video, instance, instance.video_file.path)
+        video_id = instance.id
+        # Fester Job-Schlüssel: doppelte Signale erzeugen keinen zweiten Encode.
+        # Erst nach dem Commit einreihen, sonst findet der Job den Datensatz nicht.
+        transaction.on_commit(lambda: enqueue_unique(
+            get_transcode_queue(high_priority=True), process_video_to_hls, hls_job_id(video_id), video_id=video_id
+        ))
+        # Im Single-Pass-Modus entstehen Vorschaubilder und Trickplay im HLS-Durchlauf
+        if not previews_in_encode():
+            transaction.on_commit(lambda: enqueue_thumbnail_job(video_id))
+
+    if affects_catalog(update_fields):
+        # Neue Katalog-Version erst nach dem Commit, sonst cacht ein paralleler Request den alten Stand
+        transaction.on_commit(catalog_changed, robust=True)
+
+    if getattr(instance, "_thumbnail_cleared", False):
+        print(f"Thumbnail wurde entfernt für Video {instance.id}, regeneriere im Hintergrund...")
+        video_id = instance.id
+        # Erst nach dem Commit einreihen, sonst sieht der Job noch das alte Thumbnail
+        transaction.on_commit(lambda: enqueue_thumbnail_job(video_id))
+
+    instance._thumbnail_cleared = False
+    remember_thumbnail(instance)
+
+
+def catalog_changed():
+    """Neue Katalog-Version; die Kategorie-Zeilen der Startseite werden im Hintergrund neu berechnet."""
+    enqueue_category_rows_job(bump_catalog_version())
+
+
+def remember_thumbnail(instance):
+    value = instance.__dict__.get("thumbnail")
+    instance._loaded_thumbnail = getattr(value, "name", value) or None
 
 
 @receiver(post_delete, sender=Video)
@@ -56,9 +95,30 @@ def delete_video(sender, instance, **kwargs):
         except Exception:
             pass
 
+    for name in (instance.thumbnail_sizes or {}).values():
+        try:
+            path = os.path.join(getattr(settings, "MEDIA_ROOT", ""), name)
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception:
+            pass
+
+    # Wiederverwendete Renditions sind Hardlinks, rmtree entfernt nur die eigenen Einträge
     hls_dir = os.path.join(getattr(settings, "MEDIA_ROOT", ""), "hls", str(video_id))
     try:
         if os.path.exists(hls_dir):
             shutil.rmtree(hls_dir)
     except Exception:
-        pass
\ No newline at end of file
+        pass
+
+    try:
+        delete_segment_manifests(video_id)
+    except Exception:
+        pass
+
+    transaction.on_commit(catalog_changed, robust=True)
+
+    try:
+        clear_video_progress(video_id)
+    except Exception:
+        pass
@@ -0,0 +1,77 @@
+"""Short-lived HMAC tokens for segment URLs, verified without touching the database."""
+import time
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+
+SEGMENT_TOKEN_PARAM = "token"
+SEGMENT_TOKEN_SALT = "video_app.segment"
+
+
+def signed_urls_enabled() -> bool:
+    return getattr(settings, "HLS_SIGNED_URLS", False)
+
+
+def get_token_expiry(video_duration: float = None) -> int:
+    """
+    Tokens outlive the configured TTL by the video's length, because VOD
+    players fetch a media playlist once and then request segments for the
+    whole playback.
+    """
+    ttl = getattr(settings, "HLS_SIGNED_URL_TTL", 900)
+    return int(time.time() + ttl + (video_duration or 0))
+
+
+def sign_segment_claims(user_id: int, video_id: int, rendition: str, expires: int) -> str:
+    value = f"{user_id}:{video_id}:{rendition}:{expires}"
+    return salted_hmac(SEGMENT_TOKEN_SALT, value, algorithm="sha256").hexdigest()[:32]
+
+
+def make_segment_token(user_id: int, video_id: int, rendition: str, expires: int) -> str:
+    """Token "<user>.<expires>.<signature>" bound to user, video and rendition."""
+    return f"{user_id}.{expires}.{sign_segment_claims(user_id, video_id, rendition, expires)}"
+
+
+def verify_segment_token(token: str, video_id: int, rendition: str):
+    """Return the user id of a valid, unexpired token for this video and rendition, else None."""
+    try:
+        user_id, expires, signature = token.split(".")
+        user_id, expires = int(user_id), int(expires)
+    except ValueError:
+        return None
+    if expires < time.time():
+        return None
+    if not constant_time_compare(signature, sign_segment_claims(user_id, video_id, rendition, expires)):
+        return None
+    return user_id
+
+
+class SegmentTokenUser:
+    """Authenticated user known only by the id in a verified segment token."""
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id: int):
+        self.id = self.pk = user_id
+
+
+class SegmentTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates segment requests that carry a signed token. Requests
+    without one fall through to the next authentication class.
+    """
+
+    def authenticate(self, request):
+        token = request.query_params.get(SEGMENT_TOKEN_PARAM)
+        if not token:
+            return None
+
+        kwargs = request.parser_context["kwargs"]
+        user_id = verify_segment_token(token, kwargs["movie_id"], kwargs["resolution"])
+        if user_id is None:
+            raise AuthenticationFailed("Invalid or expired segment token.")
+        return SegmentTokenUser(user_id), token
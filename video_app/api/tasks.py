@@ -1,12 +1,44 @@
-import os, subprocess, django_rq
+import os, json, math, time, shutil, hashlib, resource, tempfile, subprocess, django_rq
 
 from pathlib import Path
 
 from django.conf import settings
+from django.utils import timezone
 from django.core.files import File
 
-from ..models import Video
+from rq import get_current_job
+from rq.job import Dependency, JobStatus
 
+from ..models import Video, EncodeStat
+from .catalog import materialize_category_rows
+from .manifests import is_manifest_current, write_segment_manifest
+from .progress import ProgressReporter
+from .scheduler import TRANSCODE_QUEUE_HIGH, encode_slot, get_encode_threads, get_transcode_queue, is_priority_video
+from .playlists import parse_media_playlist, write_media_playlist, finalize_event_playlist
+
+
+HLS_MODE_SEQUENTIAL = "sequential"
+HLS_MODE_SINGLE_PASS = "single_pass"
+HLS_MODE_FANOUT = "fanout"
+HLS_MODE_CHUNKED = "chunked"
+HLS_MODE_PROGRESSIVE = "progressive"
+
+HLS_GOP_FRAMES = 150
+
+# Unfertige Ausgaben entstehen hier und werden erst komplett umbenannt
+HLS_STAGING_DIR = ".staging"
+# Vorschaubilder liegen daneben, die HLS-Jobs räumen .staging komplett weg
+PREVIEW_STAGING_DIR = ".previews"
+
+# Jobs in diesen Zuständen laufen noch, ein zweites enqueue wird übersprungen
+ACTIVE_JOB_STATUSES = {JobStatus.QUEUED, JobStatus.STARTED, JobStatus.DEFERRED, JobStatus.SCHEDULED}
+
+HLS_SEGMENT_TS = "ts"
+HLS_SEGMENT_FMP4 = "fmp4"
+
+HLS_AUDIO_MUXED = "muxed"
+HLS_AUDIO_SHARED = "shared"
+HLS_AUDIO_GROUP = "audio"
 
 HLS_VARIANTS = [
     {"name": "480p", "height": 480, "v_bitrate": "1400k", "maxrate": "1498k", "bufsize": "2100k", "bandwidth": 1600000},
@@ -14,46 +46,138 @@ HLS_VARIANTS = [
     {"name": "1080p", "height": 1080, "v_bitrate": "5000k", "maxrate": "5350k", "bufsize": "7500k", "bandwidth": 5800000},
 ]
 
+# Gemeinsame Audio-Spur für alle Varianten (HLS_AUDIO_MODE = "shared")
+HLS_AUDIO_RENDITION = {"name": "audio", "type": "audio", "bitrate": "96k", "channels": 2}
+
+# Von ffprobe befüllte Felder, bei identischer Quelle übertragbar
+SOURCE_PROBE_FIELDS = [
+    'duration', 'width', 'height', 'frame_rate', 'video_codec',
+    'audio_codec', 'audio_channels', 'audio_channel_layout',
+]
+
+# Per-Title-Analyse (HLS_PER_TITLE_ENCODING): kurze Ausschnitte in niedriger
+# Auflösung mit den Produktions-Einstellungen kodieren, die Bitrate ist das
+# Komplexitätsmaß. maxrate, Bitrate und bufsize jeder Stufe werden auf das
+# 0,35- bis 1,5-fache (HLS_PER_TITLE_MIN/MAX_FACTOR) der festen Leiter skaliert,
+# eine Stufe kann also bis zu 50 % über der festen Leiter liegen.
+HLS_ANALYSIS_SAMPLES = 5
+HLS_ANALYSIS_SAMPLE_SECONDS = 4
+HLS_ANALYSIS_HEIGHT = 240
+HLS_PER_TITLE_HEADROOM = 1.25
+HLS_PER_TITLE_MIN_FACTOR = 0.35
+HLS_PER_TITLE_MAX_FACTOR = 1.5
+
+# Vorschaubilder: bestes von THUMBNAIL_CANDIDATES Standbildern in mehreren
+# Breiten als WebP, Trickplay-Sprites (ein Bild alle TRICKPLAY_INTERVAL Sekunden)
+THUMBNAIL_WIDTHS = [320, 640, 1280]
+THUMBNAIL_DEFAULT_WIDTH = 640
+THUMBNAIL_CANDIDATES = 20
+TRICKPLAY_DIR = "trickplay"
+TRICKPLAY_VTT = "thumbnails.vtt"
+TRICKPLAY_INTERVAL = 10
+TRICKPLAY_WIDTH = 160
+TRICKPLAY_COLUMNS = 10
+TRICKPLAY_ROWS = 10
+
+# Stufen bis 5% über der Quellhöhe gelten nicht als Hochskalieren (z.B. 1920x1036)
+HLS_UPSCALE_TOLERANCE = 1.05
+
+H264_PROFILE_CODES = {
+    "Baseline": "4200",
+    "Constrained Baseline": "42C0",
+    "Main": "4D40",
+    "High": "6400",
+}
+
+AAC_PROFILE_CODES = {
+    "LC": "mp4a.40.2",
+    "HE-AAC": "mp4a.40.5",
+    "HE-AACv2": "mp4a.40.29",
+}
+
 
 def process_video_to_hls(video_id: int):
     """
-    Verarbeitet Video sequentiell: eine Variante nach der anderen
+    Verarbeitet Video je nach HLS_ENCODING_MODE:
+    - "single_pass": ein ffmpeg-Aufruf dekodiert einmal und erzeugt alle Varianten
+    - "sequential": eine Variante nach der anderen
+    - "fanout": ein RQ-Job pro Variante, Master-Playlist in einem abhängigen Job
+    - "chunked": GOP-ausgerichtete Zeitabschnitte als parallele RQ-Jobs, danach zusammengefügt
+    - "progressive": niedrigste Stufe zuerst als wachsende EVENT-Playlist, dann die höheren
+    Gibt es bereits ein fertiges Video mit identischer Quelle (source_hash),
+    werden dessen Renditions per Hardlink übernommen statt neu kodiert.
     """
     video = Video.objects.get(id=video_id)
     input_path = Path(video.video_file.path)
 
     output_root = Path(getattr(settings, 'MEDIA_ROOT')) / 'hls' / str(video.id)
+
+    existing = find_hls_source(video)
+    if existing is not None:
+        return reuse_hls_output(video, existing, output_root)
+
     output_root.mkdir(parents=True, exist_ok=True)
 
-    created_variants = []
+    # Quelle analysieren, die Leiter richtet sich nach der Quellhöhe
+    source = probe_video(video)
+    if getattr(settings, "HLS_PER_TITLE_ENCODING", False) and not video.encoding_profile:
+        with encode_slot():
+            analysis = analyze_complexity(input_path, source["duration"])
+        video.encoding_profile = build_encoding_profile(analysis, source["height"])
+        video.save(update_fields=['encoding_profile'])
+    variants = get_ladder(video)
+    shared_audio = uses_shared_audio(source["has_audio"])
 
-    # Verarbeite jede Variante nacheinander (CPU-schonend)
-    for v in HLS_VARIANTS:
-        print(f"Processing {v['name']} for video {video_id}...")
-        
-        variant_dir = output_root / v["name"]
-        variant_dir.mkdir(parents=True, exist_ok=True)
+    mode = getattr(settings, "HLS_ENCODING_MODE", HLS_MODE_SINGLE_PASS)
 
-        playlist_path = transcode_variant_to_hls(
-            input_path=input_path,
-            output_dir=variant_dir,
-            height=v["height"],
-            v_bitrate=v["v_bitrate"],
-            maxrate=v["maxrate"],
-            bufsize=v["bufsize"]
-        )
+    if mode == HLS_MODE_FANOUT:
+        return enqueue_variant_jobs(video, [r["name"] for r in get_renditions(video)])
 
-        created_variants.append({
-            "name": v["name"],
-            "height": v["height"],
-            "bandwidth": v["bandwidth"],
-            "playlist_rel": f"{v['name']}/{Path(playlist_path).name}"
-        })
-        
-        print(f"Completed {v['name']} for video {video_id}")
+    if mode == HLS_MODE_CHUNKED:
+        return enqueue_chunk_jobs(video, source)
+
+    # Neue Uploads starten auf der Vorrang-Queue, lange Videos machen dort Platz
+    job = get_current_job()
+    if job is not None and job.origin == TRANSCODE_QUEUE_HIGH and not is_priority_video(video):
+        print(f"Video {video_id} is {video.duration:.0f}s long, moving it to the regular transcode queue...")
+        return enqueue_unique(get_transcode_queue(), process_video_to_hls, hls_job_id(video.id, "long"), video_id=video.id).id
+
+    set_processing_status(video, Video.ProcessingStatus.PROCESSING)
+
+    preview_dir = None
+    if previews_in_encode() and not video.thumbnail:
+        preview_dir = get_preview_dir(output_root)
+
+    try:
+        with encode_slot():
+            started = start_encode_stat()
+            if mode == HLS_MODE_SEQUENTIAL:
+                created_variants = encode_variants_sequential(video_id, input_path, output_root, variants, shared_audio)
+            elif mode == HLS_MODE_PROGRESSIVE:
+                created_variants = encode_variants_progressive(video, input_path, output_root, variants, shared_audio)
+            else:
+                created_variants = encode_variants_single_pass(
+                    video_id, input_path, output_root, variants, source["has_audio"], shared_audio,
+                    previews=build_preview_graph(preview_dir, source["duration"]) if preview_dir else None
+                )
+            if preview_dir:
+                if any(preview_dir.glob("candidate_*")):
+                    finish_previews(video, input_path, preview_dir, output_root, source["duration"])
+                else:
+                    # Alle Stufen waren schon fertig, Vorschaubilder separat erzeugen
+                    generate_thumbnail_for_video(video, input_path)
+    except Exception:
+        set_processing_status(video, Video.ProcessingStatus.FAILED, [r["name"] for r in get_renditions(video)])
+        raise
+
+    shutil.rmtree(output_root / HLS_STAGING_DIR, ignore_errors=True)
+    if preview_dir:
+        shutil.rmtree(preview_dir, ignore_errors=True)
+    record_encode_stat(video, started, output_root, [v["name"] for v in created_variants])
 
     # Master-Playlist am Ende erstellen
-    master_path = write_master_playlist(output_root, created_variants)
+    master_path = publish_variants(video, output_root, created_variants)
+    set_processing_status(video, Video.ProcessingStatus.READY)
     
     print(f"All variants completed for video {video_id}")
 
@@ -65,6 +189,865 @@ def process_video_to_hls(video_id: int):
     }
 
 
+def find_hls_source(video: Video):
+    """
+    Inhaltsadressierter Index: fertiges Video mit gleichem source_hash,
+    dessen HLS-Ausgabe wiederverwendet werden kann.
+    """
+    if not video.source_hash:
+        return None
+    candidates = (
+        Video.objects
+        .filter(source_hash=video.source_hash, processing_status=Video.ProcessingStatus.READY)
+        .exclude(id=video.id)
+        .order_by('created_at')
+    )
+    hls_root = Path(getattr(settings, 'MEDIA_ROOT')) / 'hls'
+    for candidate in candidates:
+        if (hls_root / str(candidate.id) / 'master.m3u8').exists():
+            return candidate
+    return None
+
+
+def reuse_hls_output(video: Video, existing: Video, output_root: Path):
+    """
+    Übernimmt die Renditions von `existing` per Hardlink. Jeder Datensatz
+    besitzt eigene Verzeichniseinträge, Löschen des einen lässt die Dateien
+    des anderen unberührt.
+    """
+    existing_root = Path(getattr(settings, 'MEDIA_ROOT')) / 'hls' / str(existing.id)
+    print(f"Video {video.id} has the same source as video {existing.id}, reusing HLS output...")
+
+    link_tree(existing_root, output_root)
+
+    copied_fields = SOURCE_PROBE_FIELDS + ['encoding_profile', 'has_trickplay']
+    for field in copied_fields:
+        setattr(video, field, getattr(existing, field))
+    video.save(update_fields=copied_fields)
+
+    if existing.thumbnail_sizes and not video.thumbnail:
+        reuse_thumbnails(video, existing)
+    elif previews_in_encode() and not video.thumbnail:
+        generate_thumbnail_for_video(video)
+
+    master_path = publish_variants(video, output_root, existing.hls_variants)
+    set_processing_status(video, Video.ProcessingStatus.READY)
+
+    return {
+        "video_id": video.id,
+        "output_dir": str(output_root),
+        "master_playlist": str(master_path),
+        "variants": video.hls_variants,
+        "reused_from": existing.id
+    }
+
+
+def reuse_thumbnails(video: Video, existing: Video):
+    """Verlinkt die Vorschaubilder von `existing` unter den eigenen Dateinamen."""
+    media_root = Path(getattr(settings, 'MEDIA_ROOT'))
+    sizes = {}
+    for width, name in existing.thumbnail_sizes.items():
+        target_name = f"thumbnails/video_{video.id}_{width}.webp"
+        if (media_root / target_name).exists():
+            (media_root / target_name).unlink()
+        link_or_copy(media_root / name, media_root / target_name)
+        sizes[width] = target_name
+    save_thumbnail_sizes(video, sizes)
+
+
+def link_tree(source_root: Path, target_root: Path):
+    """Spiegelt source_root per Hardlinks, über Dateisystemgrenzen hinweg als Kopie."""
+    for source_dir, _, files in os.walk(source_root):
+        target_dir = target_root / Path(source_dir).relative_to(source_root)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for name in files:
+            target = target_dir / name
+            if target.exists():
+                target.unlink()
+            link_or_copy(Path(source_dir) / name, target)
+
+
+def link_or_copy(source: Path, target: Path):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def get_staging_dir(output_root: Path, name: str) -> Path:
+    """Leeres Arbeitsverzeichnis für <name>, Reste eines abgebrochenen Laufs werden verworfen."""
+    staging_dir = output_root / HLS_STAGING_DIR / name
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    staging_dir.parent.mkdir(parents=True, exist_ok=True)
+    return staging_dir
+
+
+def get_preview_dir(output_root: Path) -> Path:
+    """Leeres Verzeichnis für Vorschaubilder, außerhalb von HLS_STAGING_DIR."""
+    preview_dir = output_root / PREVIEW_STAGING_DIR
+    shutil.rmtree(preview_dir, ignore_errors=True)
+    preview_dir.mkdir(parents=True)
+    return preview_dir
+
+
+def commit_staging_dir(staging_dir: Path, target_dir: Path):
+    """
+    Benennt das fertige Arbeitsverzeichnis in target_dir um. Eine alte,
+    unvollständige Ausgabe wird vorher beiseitegeschoben und danach gelöscht.
+    """
+    discarded = None
+    if target_dir.exists():
+        discarded = staging_dir.with_name(f"{staging_dir.name}.old")
+        shutil.rmtree(discarded, ignore_errors=True)
+        os.rename(target_dir, discarded)
+    os.rename(staging_dir, target_dir)
+    if discarded is not None:
+        shutil.rmtree(discarded, ignore_errors=True)
+
+
+def hls_job_id(video_id: int, *parts) -> str:
+    """
+    Idempotenz-Schlüssel pro Video und Leiter-Konfiguration, z.B.
+    hls-12-3f9a0c1b2d-variant-720p.
+    """
+    return "-".join(str(p) for p in ("hls", video_id, ladder_signature(), *parts))
+
+
+def ladder_signature() -> str:
+    config = [
+        HLS_VARIANTS,
+        HLS_AUDIO_RENDITION,
+        getattr(settings, "HLS_AUDIO_MODE", HLS_AUDIO_MUXED),
+        getattr(settings, "HLS_SEGMENT_FORMAT", HLS_SEGMENT_TS),
+        getattr(settings, "HLS_SINGLE_FILE", False),
+    ]
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:10]
+
+
+def enqueue_unique(queue, func, job_id: str, **kwargs):
+    """
+    Stellt func nur dann mit job_id in die Queue, wenn nicht bereits ein Job
+    mit diesem Schlüssel wartet oder läuft. Fertige oder abgebrochene Jobs
+    werden neu eingereiht (die Jobs überspringen bereits fertige Ausgaben).
+    """
+    existing = queue.fetch_job(job_id)
+    if existing is not None and existing.get_status(refresh=False) in ACTIVE_JOB_STATUSES:
+        print(f"Job {job_id} is already queued or running, not enqueuing again")
+        return existing
+    return queue.enqueue(func, job_id=job_id, **kwargs)
+
+
+def enqueue_variant_jobs(video: Video, variant_names: list, batch: bool = False):
+    """
+    Fan-out: ein Job pro Variante auf den Transcode-Queues, damit freie Worker
+    parallel arbeiten. Die niedrigste Stufe, die Audio-Spur und kurze Videos
+    laufen über die Vorrang-Queue (außer bei batch, z.B. Wiederholungen).
+    Fan-in: finalize_hls_job läuft erst, wenn alle Varianten fertig sind
+    (auch bei Fehlern, um Teilergebnisse zu veröffentlichen).
+    """
+    set_processing_status(video, Video.ProcessingStatus.PROCESSING, video.failed_variants)
+
+    first_names = {get_ladder(video)[0]["name"], HLS_AUDIO_RENDITION["name"]}
+    variant_jobs = [
+        enqueue_unique(
+            get_transcode_queue(not batch and (name in first_names or is_priority_video(video))),
+            transcode_variant_job,
+            hls_job_id(video.id, "variant", name),
+            video_id=video.id,
+            variant_name=name
+        )
+        for name in variant_names
+    ]
+    finalize_job = enqueue_unique(
+        django_rq.get_queue('default', autocommit=True),
+        finalize_hls_job,
+        hls_job_id(video.id, "finalize"),
+        video_id=video.id,
+        depends_on=Dependency(jobs=variant_jobs, allow_failure=True)
+    )
+
+    return {
+        "video_id": video.id,
+        "variant_jobs": [job.id for job in variant_jobs],
+        "finalize_job": finalize_job.id
+    }
+
+
+def transcode_variant_job(video_id: int, variant_name: str):
+    video = Video.objects.get(id=video_id)
+    input_path = Path(video.video_file.path)
+    v = get_variant(video, variant_name)
+    output_root = Path(getattr(settings, 'MEDIA_ROOT')) / 'hls' / str(video.id)
+
+    playlist_path = output_root / v["name"] / "index.m3u8"
+    if is_playlist_complete(playlist_path):
+        print(f"Skipping {v['name']} for video {video_id}, already complete")
+        return variant_entry(v, playlist_path)
+
+    print(f"Processing {v['name']} for video {video_id}...")
+
+    with encode_slot():
+        started = start_encode_stat()
+        playlist_path = encode_rendition(input_path, output_root, v, audio=not uses_shared_audio(bool(video.audio_codec)))
+        record_encode_stat(video, started, output_root, [v["name"]])
+
+    print(f"Completed {v['name']} for video {video_id}")
+    return variant_entry(v, playlist_path)
+
+
+def finalize_hls_job(video_id: int):
+    """
+    Schreibt die Master-Playlist aus allen vollständigen Varianten und merkt
+    sich fehlgeschlagene Varianten für retry_failed_variants.
+    """
+    video = Video.objects.get(id=video_id)
+    output_root = Path(getattr(settings, 'MEDIA_ROOT')) / 'hls' / str(video.id)
+
+    created_variants = []
+    failed_variants = []
+
+    for v in get_renditions(video):
+        playlist_path = output_root / v["name"] / "index.m3u8"
+        if is_playlist_complete(playlist_path):
+            created_variants.append(variant_entry(v, playlist_path))
+        else:
+            failed_variants.append(v["name"])
+
+    shutil.rmtree(output_root / HLS_STAGING_DIR, ignore_errors=True)
+
+    master_path = None
+    if created_variants:
+        master_path = publish_variants(video, output_root, created_variants)
+
+    if not failed_variants:
+        status = Video.ProcessingStatus.READY
+    elif created_variants:
+        status = Video.ProcessingStatus.PARTIAL
+    else:
+        status = Video.ProcessingStatus.FAILED
+
+    set_processing_status(video, status, failed_variants)
+
+    print(f"Finalized video {video_id}: {len(created_variants)} variants ready, failed: {failed_variants or 'none'}")
+
+    return {
+        "video_id": video.id,
+        "master_playlist": master_path,
+        "variants": created_variants,
+        "failed_variants": failed_variants
+    }
+
+
+def enqueue_chunk_jobs(video: Video, source: dict):
+    """
+    Teilt die Quelle an GOP-Grenzen in Abschnitte, die unabhängig voneinander
+    (auch auf anderen Nodes) kodiert werden. stitch_chunks_job fügt sie danach
+    zu durchgehenden Playlists zusammen.
+    """
+    set_processing_status(video, Video.ProcessingStatus.PROCESSING)
+
+    chunks = plan_chunks(source["duration"], source["fps"], getattr(settings, "HLS_CHUNK_SECONDS", 120))
+
+    queue = get_transcode_queue(is_priority_video(video))
+    chunk_jobs = [
+        enqueue_unique(
+            queue,
+            transcode_chunk_job,
+            hls_job_id(video.id, "chunk", index),
+            video_id=video.id,
+            chunk_index=index,
+            start=start,
+            duration=duration,
+            has_audio=source["has_audio"]
+        )
+        for index, (start, duration) in enumerate(chunks)
+    ]
+    stitch_job = enqueue_unique(
+        django_rq.get_queue('default', autocommit=True),
+        stitch_chunks_job,
+        hls_job_id(video.id, "stitch"),
+        video_id=video.id,
+        chunk_count=len(chunks),
+        depends_on=Dependency(jobs=chunk_jobs, allow_failure=True)
+    )
+
+    return {
+        "video_id": video.id,
+        "chunk_jobs": [job.id for job in chunk_jobs],
+        "stitch_job": stitch_job.id
+    }
+
+
+def transcode_chunk_job(video_id: int, chunk_index: int, start: float, duration: float = None, has_audio: bool = True):
+    video = Video.objects.get(id=video_id)
+    input_path = Path(video.video_file.path)
+    output_root = Path(getattr(settings, 'MEDIA_ROOT')) / 'hls' / str(video.id)
+    chunk_dir = get_chunk_dir(output_root, chunk_index)
+
+    if all(is_playlist_complete(chunk_dir / v["name"] / "index.m3u8") for v in get_renditions(video)):
+        print(f"Skipping chunk {chunk_index} for video {video_id}, already complete")
+        return
+
+    print(f"Processing chunk {chunk_index} ({start:.2f}s) for video {video_id}...")
+    with encode_slot():
+        started = start_encode_stat()
+        playlist_paths = transcode_chunk(
+            input_path, chunk_dir, get_ladder(video),
+            start, duration, has_audio, uses_shared_audio(has_audio)
+        )
+        record_encode_stat(video, started, chunk_dir, list(playlist_paths), chunk_index)
+    print(f"Completed chunk {chunk_index} for video {video_id}")
+
+
+def stitch_chunks_job(video_id: int, chunk_count: int):
+    video = Video.objects.get(id=video_id)
+    output_root = Path(getattr(settings, 'MEDIA_ROOT')) / 'hls' / str(video.id)
+    chunk_dirs = [get_chunk_dir(output_root, index) for index in range(chunk_count)]
+    variants = get_renditions(video)
+
+    missing = [
+        v["name"] for v in variants
+        if not all(is_playlist_complete(d / v["name"] / "index.m3u8") for d in chunk_dirs)
+    ]
+    if missing:
+        # Ohne alle Abschnitte gibt es keine lückenlose Playlist
+        set_processing_status(video, Video.ProcessingStatus.FAILED, [v["name"] for v in variants])
+        raise RuntimeError(f"Chunks incomplete for video {video_id}: {missing}")
+
+    created_variants = stitch_chunks(output_root, chunk_dirs, variants)
+    shutil.rmtree(output_root / "_chunks", ignore_errors=True)
+    shutil.rmtree(output_root / HLS_STAGING_DIR, ignore_errors=True)
+
+    master_path = publish_variants(video, output_root, created_variants)
+    set_processing_status(video, Video.ProcessingStatus.READY)
+
+    print(f"Stitched {chunk_count} chunks for video {video_id}")
+
+    return {
+        "video_id": video.id,
+        "master_playlist": master_path,
+        "variants": created_variants
+    }
+
+
+def plan_chunks(duration: float, fps: float, chunk_seconds: float, gop_frames: int = HLS_GOP_FRAMES):
+    """
+    Abschnittslänge ist ein Vielfaches der GOP-Dauer (-g 150), damit die
+    Schnittpunkte genau auf Keyframes des sequentiellen Encodes fallen.
+    Der letzte Abschnitt läuft ohne -t bis zum Ende der Quelle.
+    """
+    gop_seconds = gop_frames / fps if fps else 6
+    chunk_length = max(1, round(chunk_seconds / gop_seconds)) * gop_seconds
+
+    count = max(1, math.ceil(duration / chunk_length)) if duration else 1
+    chunks = [(index * chunk_length, chunk_length) for index in range(count)]
+    chunks[-1] = (chunks[-1][0], None)
+    return chunks
+
+
+def get_chunk_dir(output_root: Path, chunk_index: int) -> Path:
+    return output_root / "_chunks" / f"{chunk_index:05d}"
+
+
+def transcode_chunk(
+    input_path: Path,
+    chunk_dir: Path,
+    variants: list,
+    start: float,
+    duration: float = None,
+    has_audio: bool = True,
+    shared_audio: bool = False
+):
+    staging_dir = get_staging_dir(chunk_dir.parent, chunk_dir.name)
+    transcode_ladder_to_hls(
+        input_path=input_path,
+        output_root=staging_dir,
+        variants=variants,
+        has_audio=has_audio,
+        shared_audio=shared_audio,
+        start=start,
+        duration=duration
+    )
+    commit_staging_dir(staging_dir, chunk_dir)
+
+    names = [v["name"] for v in variants] + ([HLS_AUDIO_RENDITION["name"]] if shared_audio and has_audio else [])
+    return {name: str(chunk_dir / name / "index.m3u8") for name in names}
+
+
+def stitch_chunks(output_root: Path, chunk_dirs: list, variants: list):
+    """
+    Verlinkt die Segmente aller Abschnitte nach <output_root>/<name>/ mit
+    fortlaufender Nummerierung und schreibt eine VOD-Playlist mit
+    EXT-X-DISCONTINUITY an jeder Abschnittsgrenze. Die Abschnitte bleiben
+    unverändert, ein abgebrochenes Zusammenfügen kann einfach wiederholt werden.
+    """
+    created_variants = []
+
+    for v in variants:
+        variant_dir = get_staging_dir(output_root, v["name"])
+        variant_dir.mkdir()
+
+        segments = []
+        for chunk_index, chunk_dir in enumerate(chunk_dirs):
+            chunk_variant_dir = chunk_dir / v["name"]
+            moved = {}
+            for position, segment in enumerate(parse_media_playlist(chunk_variant_dir / "index.m3u8")):
+                init_map = segment["map"]
+                if init_map:
+                    init_map = dict(init_map, uri=move_chunk_file(chunk_variant_dir, variant_dir, init_map["uri"], chunk_index, moved))
+
+                if segment["byterange"]:
+                    # Eine Datei pro Abschnitt, die Byte-Offsets bleiben gültig
+                    name = move_chunk_file(chunk_variant_dir, variant_dir, segment["uri"], chunk_index, moved)
+                else:
+                    name = f"seg_{len(segments):05d}{Path(segment['uri']).suffix}"
+                    link_or_copy(chunk_variant_dir / segment["uri"], variant_dir / name)
+
+                segments.append({
+                    "duration": segment["duration"],
+                    "uri": name,
+                    "discontinuity": chunk_index > 0 and position == 0,
+                    "byterange": segment["byterange"],
+                    "map": init_map,
+                })
+
+        write_media_playlist(variant_dir / "index.m3u8", segments)
+        commit_staging_dir(variant_dir, output_root / v["name"])
+        created_variants.append(variant_entry(v, output_root / v["name"] / "index.m3u8"))
+
+    return created_variants
+
+
+def move_chunk_file(chunk_variant_dir: Path, variant_dir: Path, uri: str, chunk_index: int, moved: dict) -> str:
+    """
+    Verlinkt eine Datei, die von mehreren Playlist-Einträgen referenziert
+    wird (Init-Segment, single_file), einmal pro Abschnitt als <stem>_<chunk><suffix>.
+    """
+    if uri not in moved:
+        path = Path(uri)
+        name = f"{path.stem}_{chunk_index:05d}{path.suffix}"
+        link_or_copy(chunk_variant_dir / uri, variant_dir / name)
+        moved[uri] = name
+    return moved[uri]
+
+
+def retry_failed_variants(video_id: int):
+    """
+    Stellt nur die fehlgeschlagenen Varianten erneut in die Queue.
+    """
+    video = Video.objects.get(id=video_id)
+    if not video.failed_variants:
+        return None
+    return enqueue_variant_jobs(video, list(video.failed_variants), batch=True)
+
+
+def set_processing_status(video: Video, status: str, failed_variants: list = None):
+    video.processing_status = status
+    video.failed_variants = failed_variants or []
+    video.save(update_fields=['processing_status', 'failed_variants'])
+
+
+def start_encode_stat() -> tuple:
+    return time.perf_counter(), children_cpu_time()
+
+
+def children_cpu_time() -> float:
+    # ffmpeg läuft als Kindprozess, nach wait() zählt seine CPU-Zeit hier mit
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def record_encode_stat(video: Video, started: tuple, output_root: Path, rendition_names: list, chunk_index: int = None):
+    """Speichert Wall-/CPU-Zeit eines Encodes und die geschriebenen Bytes pro Rendition."""
+    wall_started, cpu_started = started
+    return EncodeStat.objects.create(
+        video=video,
+        mode=getattr(settings, "HLS_ENCODING_MODE", HLS_MODE_SINGLE_PASS),
+        ladder_signature=ladder_signature(),
+        chunk_index=chunk_index,
+        wall_time=time.perf_counter() - wall_started,
+        cpu_time=children_cpu_time() - cpu_started,
+        output_bytes={name: directory_size(output_root / name) for name in rendition_names},
+    )
+
+
+def directory_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def select_variants(source_height: int) -> list:
+    """
+    Nur Stufen bis zur Quellhöhe, damit nichts hochskaliert wird. Ist die
+    Quelle kleiner als die niedrigste Stufe, wird sie in Originalhöhe kodiert.
+    """
+    if not source_height:
+        return list(HLS_VARIANTS)
+
+    variants = [v for v in HLS_VARIANTS if v["height"] <= source_height * HLS_UPSCALE_TOLERANCE]
+    if not variants:
+        height = source_height - source_height % 2
+        variants = [dict(HLS_VARIANTS[0], name=f"{height}p", height=height)]
+    return variants
+
+
+def get_ladder(video: Video) -> list:
+    return apply_encoding_profile(select_variants(video.height), video.encoding_profile)
+
+
+def apply_encoding_profile(variants: list, profile: dict) -> list:
+    """Ersetzt die festen Bitraten-Obergrenzen durch die des Per-Title-Profils."""
+    rungs = (profile or {}).get("rungs", {})
+    return [dict(v, **rungs.get(v["name"], {})) for v in variants]
+
+
+def analyze_complexity(
+    input_path: Path,
+    duration: float,
+    samples: int = HLS_ANALYSIS_SAMPLES,
+    sample_seconds: float = HLS_ANALYSIS_SAMPLE_SECONDS
+) -> dict:
+    """
+    Kodiert über die Quelle verteilte Ausschnitte in einem ffmpeg-Aufruf
+    (schnelles Springen per -ss je Eingang, concat) in HLS_ANALYSIS_HEIGHT mit
+    denselben CRF-Einstellungen wie die Leiter. Statische Inhalte ergeben
+    eine niedrige, Action-Szenen eine hohe Bitrate.
+    """
+    if not duration or duration <= samples * sample_seconds:
+        starts, sample_seconds = [0.0], duration or sample_seconds
+    else:
+        starts = [(duration - sample_seconds) * (i + 0.5) / samples for i in range(samples)]
+
+    cmd = ["ffmpeg", "-y"]
+    for start in starts:
+        cmd += ["-ss", f"{start:.3f}", "-t", f"{sample_seconds:.3f}", "-i", str(input_path)]
+
+    inputs = "".join(f"[{i}:v:0]" for i in range(len(starts)))
+    with tempfile.TemporaryDirectory(prefix="hls-analysis-") as workdir:
+        output_path = Path(workdir) / "analysis.mp4"
+        cmd += [
+            "-filter_complex", f"{inputs}concat=n={len(starts)}:v=1:a=0,scale=-2:{HLS_ANALYSIS_HEIGHT}[v]",
+            "-map", "[v]",
+            "-c:v", "libx264",
+            "-preset", "ultrafast",
+            "-tune", "zerolatency",
+            "-crf", "28",
+            "-an",
+            "-threads", str(get_encode_threads()),
+            str(output_path),
+        ]
+        run_ffmpeg(cmd)
+        size = output_path.stat().st_size
+
+    sampled_seconds = len(starts) * sample_seconds
+    return {
+        "analysis_height": HLS_ANALYSIS_HEIGHT,
+        "sampled_seconds": round(sampled_seconds, 3),
+        "analysis_kbps": round(size * 8 / sampled_seconds / 1000, 1),
+    }
+
+
+def build_encoding_profile(analysis: dict, source_height: int) -> dict:
+    """
+    Rechnet die Analyse-Bitrate proportional zur Pixelzahl auf jede Stufe
+    hoch (eher zu hoch als zu niedrig, komplexe Inhalte sollen nicht
+    verhungern) und leitet daraus maxrate/bufsize ab, begrenzt auf
+    HLS_PER_TITLE_MIN_FACTOR..HLS_PER_TITLE_MAX_FACTOR der festen Leiter.
+    """
+    rungs = {}
+    for v in select_variants(source_height):
+        base_maxrate = parse_kbps(v["maxrate"])
+        predicted = analysis["analysis_kbps"] * (v["height"] / analysis["analysis_height"]) ** 2
+        maxrate = min(
+            max(predicted * HLS_PER_TITLE_HEADROOM, base_maxrate * HLS_PER_TITLE_MIN_FACTOR),
+            base_maxrate * HLS_PER_TITLE_MAX_FACTOR
+        )
+        factor = maxrate / base_maxrate
+        rungs[v["name"]] = {
+            "v_bitrate": f"{round(parse_kbps(v['v_bitrate']) * factor)}k",
+            "maxrate": f"{round(maxrate)}k",
+            "bufsize": f"{round(parse_kbps(v['bufsize']) * factor)}k",
+            "bandwidth": round(v["bandwidth"] * factor),
+        }
+    return {**analysis, "rungs": rungs}
+
+
+def parse_kbps(value: str) -> float:
+    value = str(value).lower()
+    if value.endswith("m"):
+        return float(value[:-1]) * 1000
+    if value.endswith("k"):
+        return float(value[:-1])
+    return float(value) / 1000
+
+
+def uses_shared_audio(has_audio: bool) -> bool:
+    return has_audio and getattr(settings, "HLS_AUDIO_MODE", HLS_AUDIO_MUXED) == HLS_AUDIO_SHARED
+
+
+def get_renditions(video: Video) -> list:
+    """Videostufen plus ggf. die gemeinsame Audio-Spur."""
+    renditions = list(get_ladder(video))
+    if uses_shared_audio(bool(video.audio_codec)):
+        renditions.append(HLS_AUDIO_RENDITION)
+    return renditions
+
+
+def get_variant(video: Video, name: str) -> dict:
+    for v in get_renditions(video):
+        if v["name"] == name:
+            return v
+    raise ValueError(f"Unknown HLS variant: {name}")
+
+
+def publish_variants(video: Video, output_root: Path, variants: list):
+    # Segment-Manifest für fertige Stufen; wachsende EVENT-Playlists bekommen erst nach dem Umstellen eins
+    for v in variants:
+        variant_dir = output_root / v["name"]
+        if is_playlist_complete(variant_dir / "index.m3u8") and not is_manifest_current(variant_dir):
+            write_segment_manifest(video.id, variant_dir)
+
+    master_path = write_master_playlist(output_root, variants)
+    video.hls_variants = sorted(variants, key=lambda x: x.get("height") or 0)
+    update_fields = ['hls_variants']
+
+    # Erste Veröffentlichung = Video ist abspielbar
+    if video.first_playable_at is None:
+        video.first_playable_at = timezone.now()
+        video.time_to_first_playable = (video.first_playable_at - video.created_at).total_seconds()
+        update_fields += ['first_playable_at', 'time_to_first_playable']
+
+    video.save(update_fields=update_fields)
+    return master_path
+
+
+def is_playlist_complete(playlist_path: Path) -> bool:
+    if not playlist_path.exists():
+        return False
+    return "#EXT-X-ENDLIST" in playlist_path.read_text(encoding="utf-8")
+
+
+def encode_variants_sequential(video_id: int, input_path: Path, output_root: Path, variants: list, shared_audio: bool = False):
+    created_variants = []
+    renditions = ([HLS_AUDIO_RENDITION] if shared_audio else []) + list(variants)
+
+    # Verarbeite jede Variante nacheinander (CPU-schonend)
+    for v in renditions:
+        playlist_path = output_root / v["name"] / "index.m3u8"
+        if is_playlist_complete(playlist_path):
+            print(f"Skipping {v['name']} for video {video_id}, already complete")
+            created_variants.append(variant_entry(v, playlist_path))
+            continue
+
+        print(f"Processing {v['name']} for video {video_id}...")
+
+        playlist_path = encode_rendition(input_path, output_root, v, audio=not shared_audio)
+
+        created_variants.append(variant_entry(v, playlist_path))
+        
+        print(f"Completed {v['name']} for video {video_id}")
+
+    return created_variants
+
+
+def encode_variants_single_pass(
+    video_id: int,
+    input_path: Path,
+    output_root: Path,
+    variants: list,
+    has_audio: bool = None,
+    shared_audio: bool = False,
+    previews: dict = None
+):
+    if has_audio is None:
+        has_audio = probe_has_audio(input_path)
+    shared_audio = shared_audio and has_audio
+
+    # Nach einem Abbruch nur die Stufen kodieren, deren Playlist noch unvollständig ist
+    renditions = list(variants) + ([HLS_AUDIO_RENDITION] if shared_audio else [])
+    pending = [v for v in renditions if not is_playlist_complete(output_root / v["name"] / "index.m3u8")]
+    pending_video = [v for v in pending if v.get("type") != "audio"]
+    audio_pending = HLS_AUDIO_RENDITION in pending
+
+    if pending_video:
+        print(f"Processing {', '.join(v['name'] for v in pending)} in one pass for video {video_id}...")
+
+        staging_root = get_staging_dir(output_root, "_ladder")
+        playlist_paths = transcode_ladder_to_hls(
+            input_path=input_path,
+            output_root=staging_root,
+            variants=pending_video,
+            # Fertige gemeinsame Audio-Spur nicht erneut kodieren
+            has_audio=has_audio and (audio_pending or not shared_audio),
+            shared_audio=shared_audio,
+            previews=previews
+        )
+        for name in playlist_paths:
+            commit_staging_dir(staging_root / name, output_root / name)
+        shutil.rmtree(staging_root, ignore_errors=True)
+
+        print(f"Completed single pass for video {video_id}")
+    elif audio_pending:
+        encode_rendition(input_path, output_root, HLS_AUDIO_RENDITION)
+
+    return [variant_entry(v, output_root / v["name"] / "index.m3u8") for v in renditions]
+
+
+def encode_variants_progressive(video: Video, input_path: Path, output_root: Path, variants: list, shared_audio: bool = False):
+    """
+    Niedrigste Stufe zuerst als EVENT-Playlist: sobald das erste Segment
+    existiert, wird die Master-Playlist veröffentlicht und das Video ist
+    abspielbar. Nach dem Encode wird die Playlist auf VOD umgestellt, danach
+    folgen die höheren Stufen und die Master-Playlist wächst mit.
+    Die EVENT-Stufen entstehen direkt im Zielverzeichnis (sie sollen ja schon
+    während des Encodes sichtbar sein), fertige Stufen werden übersprungen.
+    """
+    lowest, higher = variants[0], variants[1:]
+    first = [lowest] + ([HLS_AUDIO_RENDITION] if shared_audio else [])
+    pending = [v for v in first if not is_playlist_complete(output_root / v["name"] / "index.m3u8")]
+
+    if pending:
+        print(f"Processing {', '.join(v['name'] for v in pending)} progressively for video {video.id}...")
+
+    # Bei gemeinsamer Audio-Spur laufen Audio und niedrigste Stufe parallel als EVENT
+    processes = []
+    for v in pending:
+        variant_dir = output_root / v["name"]
+        shutil.rmtree(variant_dir, ignore_errors=True)
+        variant_dir.mkdir(parents=True)
+        processes.append((v, variant_dir / "index.m3u8", start_ffmpeg(build_rendition_command(
+            input_path, variant_dir, v, audio=not shared_audio, playlist_type="event"
+        ))))
+
+    if processes and all(wait_for_first_segment(process, playlist_path) for _, playlist_path, process in processes):
+        publish_variants(video, output_root, [variant_entry(v, output_root / v["name"] / "index.m3u8") for v in first])
+        print(f"Video {video.id} playable after {video.time_to_first_playable:.1f}s")
+
+    for _, playlist_path, process in processes:
+        wait_ffmpeg(process)
+        finalize_event_playlist(playlist_path)
+
+    created_variants = [variant_entry(v, output_root / v["name"] / "index.m3u8") for v in first]
+    publish_variants(video, output_root, created_variants)
+
+    print(f"Completed {', '.join(v['name'] for v in first)} for video {video.id}")
+
+    for v in higher:
+        playlist_path = output_root / v["name"] / "index.m3u8"
+        if is_playlist_complete(playlist_path):
+            print(f"Skipping {v['name']} for video {video.id}, already complete")
+            created_variants.append(variant_entry(v, playlist_path))
+            continue
+
+        print(f"Processing {v['name']} for video {video.id}...")
+
+        playlist_path = encode_rendition(input_path, output_root, v, audio=not shared_audio)
+
+        created_variants.append(variant_entry(v, playlist_path))
+        publish_variants(video, output_root, created_variants)
+
+        print(f"Completed {v['name']} for video {video.id}")
+
+    return created_variants
+
+
+def encode_rendition(input_path: Path, output_root: Path, rendition: dict, audio: bool = True):
+    """
+    Kodiert eine Videostufe (mit oder ohne Ton) oder die gemeinsame Audio-Spur
+    im Arbeitsverzeichnis und benennt sie erst nach Erfolg in <name>/ um.
+    """
+    staging_dir = get_staging_dir(output_root, rendition["name"])
+    staging_dir.mkdir()
+    run_ffmpeg(build_rendition_command(input_path, staging_dir, rendition, audio=audio))
+
+    output_dir = output_root / rendition["name"]
+    commit_staging_dir(staging_dir, output_dir)
+    return str(output_dir / "index.m3u8")
+
+
+def build_rendition_command(input_path: Path, output_dir: Path, rendition: dict, audio: bool = True, playlist_type: str = "vod"):
+    if rendition.get("type") == "audio":
+        return build_audio_command(input_path, output_dir, rendition, playlist_type=playlist_type)
+    return build_variant_command(
+        input_path=input_path,
+        output_dir=output_dir,
+        height=rendition["height"],
+        v_bitrate=rendition["v_bitrate"],
+        maxrate=rendition["maxrate"],
+        bufsize=rendition["bufsize"],
+        playlist_type=playlist_type,
+        audio=audio
+    )
+
+
+def wait_for_first_segment(process: subprocess.Popen, playlist_path: Path, poll_interval: float = 0.5) -> bool:
+    while process.poll() is None:
+        if playlist_path.exists() and parse_media_playlist(playlist_path):
+            return True
+        time.sleep(poll_interval)
+    return False
+
+
+def variant_entry(variant: dict, playlist_path: str):
+    """
+    Beschreibt eine fertige Variante mit den tatsächlich erzeugten Werten
+    (Auflösung, Codecs, Spitzen-/Durchschnittsbitrate der Segmente).
+    """
+    stats = measure_variant(Path(playlist_path))
+
+    if variant.get("type") == "audio":
+        return {
+            "name": variant["name"],
+            "type": "audio",
+            "channels": variant["channels"],
+            "bandwidth": stats["peak_bandwidth"],
+            "average_bandwidth": stats["average_bandwidth"],
+            "codecs": stats["codecs"],
+            "playlist_rel": f"{variant['name']}/{Path(playlist_path).name}"
+        }
+
+    return {
+        "name": variant["name"],
+        "width": stats["width"],
+        "height": stats["height"] or variant["height"],
+        "bandwidth": stats["peak_bandwidth"] or variant["bandwidth"],
+        "average_bandwidth": stats["average_bandwidth"],
+        "codecs": stats["codecs"],
+        "playlist_rel": f"{variant['name']}/{Path(playlist_path).name}"
+    }
+
+
+def measure_variant(playlist_path: Path) -> dict:
+    segments = parse_media_playlist(playlist_path)
+    variant_dir = playlist_path.parent
+
+    peak = 0
+    total_bits = 0
+    total_duration = 0.0
+    for segment in segments:
+        if segment["byterange"]:
+            bits = segment["byterange"][0] * 8
+        else:
+            bits = (variant_dir / segment["uri"]).stat().st_size * 8
+        total_bits += bits
+        total_duration += segment["duration"]
+        if segment["duration"] > 0:
+            peak = max(peak, bits / segment["duration"])
+
+    stats = {
+        "peak_bandwidth": math.ceil(peak),
+        "average_bandwidth": math.ceil(total_bits / total_duration) if total_duration else 0,
+        "width": None,
+        "height": None,
+        "codecs": "",
+    }
+
+    if segments:
+        # fMP4-Segmente enthalten keine Codec-Infos, die stehen im Init-Segment
+        first = segments[0]
+        stats.update(probe_segment(variant_dir / (first["map"] or first)["uri"]))
+    return stats
+
+
 def transcode_variant_to_hls(
     input_path: Path,
     output_dir: Path,
@@ -74,9 +1057,23 @@ def transcode_variant_to_hls(
     bufsize: str,
     hls_time: int = 6  # Längere Segmente = weniger CPU
 ):
+    cmd = build_variant_command(input_path, output_dir, height, v_bitrate, maxrate, bufsize, hls_time)
+    run_ffmpeg(cmd)
+    return str(output_dir / "index.m3u8")
+
 
+def build_variant_command(
+    input_path: Path,
+    output_dir: Path,
+    height: int,
+    v_bitrate: str,
+    maxrate: str,
+    bufsize: str,
+    hls_time: int = 6,
+    playlist_type: str = "vod",
+    audio: bool = True
+):
     variant_playlist = output_dir / "index.m3u8"
-    segment_pattern = output_dir / "seg_%05d.ts"
 
     cmd = [
         "ffmpeg",
@@ -92,65 +1089,582 @@ def transcode_variant_to_hls(
         "-sc_threshold", "0",
         "-maxrate", maxrate,
         "-bufsize", bufsize,
+    ]
+    if audio:
+        cmd += [
+            "-c:a", "aac",
+            "-b:a", "96k",
+            "-ac", "2",
+        ]
+    else:
+        cmd += ["-an"]
+    cmd += hls_muxer_options(output_dir, hls_time, playlist_type)
+    cmd += [
+        "-threads", str(get_encode_threads()),
+        str(variant_playlist),
+    ]
+    return cmd
+
+
+def build_audio_command(input_path: Path, output_dir: Path, rendition: dict, hls_time: int = 6, playlist_type: str = "vod"):
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-i", str(input_path),
+        "-vn",
         "-c:a", "aac",
-        "-b:a", "96k",
-        "-ac", "2",
+        "-b:a", rendition["bitrate"],
+        "-ac", str(rendition["channels"]),
+    ]
+    cmd += hls_muxer_options(output_dir, hls_time, playlist_type)
+    cmd += [str(output_dir / "index.m3u8")]
+    return cmd
+
+
+def hls_muxer_options(output_dir: Path, hls_time: int = 6, playlist_type: str = "vod"):
+    """
+    HLS-Muxer-Optionen je nach HLS_SEGMENT_FORMAT und HLS_SINGLE_FILE:
+    - "ts": MPEG-TS-Segmente seg_%05d.ts
+    - "fmp4": CMAF-Segmente seg_%05d.m4s plus Init-Segment (EXT-X-MAP). ffmpeg
+      nennt es init.mp4, mit -var_stream_map aber init_<Stream-Index>.mp4
+      (-hls_fmp4_init_filename wird dort ignoriert); den echten Namen
+      liefert immer das EXT-X-MAP der Playlist.
+    Mit HLS_SINGLE_FILE landet jede Variante in einer einzigen Datei
+    (stream.ts / stream.m4s), die Playlist adressiert per EXT-X-BYTERANGE.
+    """
+    fmp4 = getattr(settings, "HLS_SEGMENT_FORMAT", HLS_SEGMENT_TS) == HLS_SEGMENT_FMP4
+    single_file = getattr(settings, "HLS_SINGLE_FILE", False)
+    extension = "m4s" if fmp4 else "ts"
+
+    options = [
         "-hls_time", str(hls_time),
-        "-hls_playlist_type", "vod",
-        "-hls_segment_filename", str(segment_pattern),
-        "-threads", "2",
-        str(variant_playlist),
+        "-hls_playlist_type", playlist_type,
     ]
+    if fmp4:
+        options += ["-hls_segment_type", "fmp4"]
+
+    flags = []
+    if single_file:
+        flags.append("single_file")
+    elif playlist_type == "event":
+        # Segmente erst nach Fertigstellung umbenennen, Player sehen nie halbe Dateien
+        flags.append("temp_file")
+    if flags:
+        options += ["-hls_flags", "+".join(flags)]
+
+    segment_name = f"stream.{extension}" if single_file else f"seg_%05d.{extension}"
+    options += ["-hls_segment_filename", str(output_dir / segment_name)]
+    return options
+
+
+def transcode_ladder_to_hls(
+    input_path: Path,
+    output_root: Path,
+    variants: list,
+    has_audio: bool = True,
+    hls_time: int = 6,
+    start: float = None,
+    duration: float = None,
+    shared_audio: bool = False,
+    previews: dict = None
+):
+    """
+    Ein Dekodier-Durchlauf für die ganze Leiter: split/scale-Filtergraph
+    plus var_stream_map, Ausgabe in <output_root>/<name>/index.m3u8.
+    Mit shared_audio wird der Ton nur einmal kodiert und als eigene
+    Audio-Variante geschrieben, die Videovarianten bleiben stumm.
+    previews (build_preview_graph) hängt Vorschaubilder und Trickplay-Sprites
+    als weiteren Zweig an denselben Dekodier-Durchlauf.
+    """
+    shared_audio = shared_audio and has_audio
+    count = len(variants)
+    split_labels = "".join(f"[s{i}]" for i in range(count))
+    if previews:
+        filter_parts = [f"[0:v]split={count + 1}{split_labels}[{previews['input']}]"]
+    else:
+        filter_parts = [f"[0:v]split={count}{split_labels}"]
+    for i, v in enumerate(variants):
+        filter_parts.append(f"[s{i}]scale=-2:{v['height']}[v{i}]")
+    if previews:
+        filter_parts += previews["filters"]
+
+    cmd = ["ffmpeg", "-y"]
+    if start:
+        cmd += ["-ss", f"{start:.3f}"]
+    if duration:
+        cmd += ["-t", f"{duration:.3f}"]
+    cmd += [
+        "-i", str(input_path),
+        "-filter_complex", ";".join(filter_parts),
+    ]
+
+    stream_map = []
+    for i, v in enumerate(variants):
+        (output_root / v["name"]).mkdir(parents=True, exist_ok=True)
+
+        cmd += ["-map", f"[v{i}]"]
+        if has_audio and not shared_audio:
+            cmd += ["-map", "0:a:0"]
+
+        cmd += [
+            f"-c:v:{i}", "libx264",
+            f"-maxrate:v:{i}", v["maxrate"],
+            f"-bufsize:v:{i}", v["bufsize"],
+        ]
+        if has_audio and not shared_audio:
+            stream_map.append(f"v:{i},a:{i},name:{v['name']}")
+        else:
+            stream_map.append(f"v:{i},name:{v['name']}")
+
+    if shared_audio:
+        (output_root / HLS_AUDIO_RENDITION["name"]).mkdir(parents=True, exist_ok=True)
+        cmd += ["-map", "0:a:0"]
+        stream_map.append(f"a:0,name:{HLS_AUDIO_RENDITION['name']}")
+
+    cmd += [
+        "-preset", "ultrafast",
+        "-tune", "zerolatency",
+        "-crf", "28",
+        "-g", "150",
+        "-keyint_min", "150",
+        "-sc_threshold", "0",
+    ]
+
+    if has_audio:
+        cmd += [
+            "-c:a", "aac",
+            "-b:a", HLS_AUDIO_RENDITION["bitrate"],
+            "-ac", str(HLS_AUDIO_RENDITION["channels"]),
+        ]
+
+    cmd += [
+        "-f", "hls",
+        *hls_muxer_options(output_root / "%v", hls_time),
+        "-var_stream_map", " ".join(stream_map),
+    ]
+    if start:
+        # Zeitstempel laufen über Abschnittsgrenzen hinweg weiter
+        cmd += ["-output_ts_offset", f"{start:.3f}"]
+    cmd += [
+        "-threads", str(get_encode_threads()),
+        str(output_root / "%v" / "index.m3u8"),
+    ]
+    if previews:
+        cmd += previews["outputs"]
 
     run_ffmpeg(cmd)
-    return str(variant_playlist)
+
+    names = [v["name"] for v in variants] + ([HLS_AUDIO_RENDITION["name"]] if shared_audio else [])
+    return {name: str(output_root / name / "index.m3u8") for name in names}
 
 
 def write_master_playlist(output_root: Path, variants: list):
     master_path = output_root / "master.m3u8"
 
+    audio = next((v for v in variants if v.get("type") == "audio"), None)
+    video_variants = [v for v in variants if v.get("type") != "audio"]
+
     lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
 
-    for v in sorted(variants, key=lambda x: x["height"]):
-        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={v["bandwidth"]},RESOLUTION=1920x{v["height"]}')
+    if audio:
+        lines.append(
+            f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="{HLS_AUDIO_GROUP}",NAME="Default",DEFAULT=YES,AUTOSELECT=YES,'
+            f'CHANNELS="{audio["channels"]}",URI="{audio["playlist_rel"]}"'
+        )
+
+    for v in sorted(video_variants, key=lambda x: x["height"]):
+        # Bandbreite und Codecs gelten für Video + Audio-Gruppe zusammen
+        bandwidth = v["bandwidth"] + (audio["bandwidth"] if audio else 0)
+        average_bandwidth = v.get("average_bandwidth") and v["average_bandwidth"] + (audio["average_bandwidth"] if audio else 0)
+        codecs = ",".join(filter(None, [v.get("codecs"), audio and audio.get("codecs")]))
+
+        attributes = [f'BANDWIDTH={bandwidth}']
+        if average_bandwidth:
+            attributes.append(f'AVERAGE-BANDWIDTH={average_bandwidth}')
+        if v.get("width"):
+            attributes.append(f'RESOLUTION={v["width"]}x{v["height"]}')
+        if codecs:
+            attributes.append(f'CODECS="{codecs}"')
+        if audio:
+            attributes.append(f'AUDIO="{HLS_AUDIO_GROUP}"')
+
+        lines.append(f'#EXT-X-STREAM-INF:{",".join(attributes)}')
         lines.append(v["playlist_rel"])
     
-    master_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    tmp_path = output_root / "master.m3u8.tmp"
+    tmp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    tmp_path.replace(master_path)
     return str(master_path)
 
 
 def run_ffmpeg(cmd: list):
+    """
+    Liest ffmpegs -progress-Ausgabe zeilenweise mit und veröffentlicht jeden
+    Block (Zeit, fps, speed) für den laufenden RQ-Job in Redis. stderr landet
+    in einer temporären Datei statt im Speicher.
+    """
+    process = start_ffmpeg([cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]], stdout=subprocess.PIPE)
+    reporter = ProgressReporter.for_current_job()
+
+    block = {}
+    for line in process.stdout:
+        key, _, value = line.decode("utf-8", errors="replace").strip().partition("=")
+        block[key] = value
+        # Jeder Block endet mit progress=continue bzw. progress=end
+        if key == "progress":
+            if reporter:
+                reporter.publish(block)
+            block = {}
+
+    process.stdout.close()
+    wait_ffmpeg(process)
+
+
+def start_ffmpeg(cmd: list, stdout=subprocess.DEVNULL) -> subprocess.Popen:
+    # stderr in eine Datei statt in eine Pipe, damit ffmpeg nie blockiert
+    log_file = tempfile.TemporaryFile()
+    process = subprocess.Popen(cmd, stdout=stdout, stderr=log_file, env=os.environ.copy())
+    process.log_file = log_file
+    return process
+
+
+def wait_ffmpeg(process: subprocess.Popen):
+    process.wait()
+    process.log_file.seek(0)
+    stderr = process.log_file.read().decode("utf-8", errors="replace")
+    process.log_file.close()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: (code {process.returncode}) {stderr}")
+
+
+def run_ffprobe(cmd: list) -> str:
     p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=os.environ.copy())
     if p.returncode != 0:
-        raise RuntimeError(f"ffmpeg failed: (code {p.returncode}) {p.stderr}")
-    
+        raise RuntimeError(f"ffprobe failed: (code {p.returncode}) {p.stderr}")
+    return p.stdout
+
+
+def probe_has_audio(input_path: Path) -> bool:
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "stream=index",
+        "-of", "csv=p=0",
+        str(input_path),
+    ]
+    return bool(run_ffprobe(cmd).strip())
+
+
+def probe_source(input_path: Path) -> dict:
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "format=duration:stream=codec_type,codec_name,width,height,r_frame_rate,channels,channel_layout",
+        "-of", "json",
+        str(input_path),
+    ]
+    data = json.loads(run_ffprobe(cmd))
+    streams = data.get("streams", [])
+    video_stream = next((st for st in streams if st.get("codec_type") == "video"), {})
+    audio_stream = next((st for st in streams if st.get("codec_type") == "audio"), None)
+
+    return {
+        "duration": float(data.get("format", {}).get("duration") or 0),
+        "width": video_stream.get("width"),
+        "height": video_stream.get("height"),
+        "fps": parse_frame_rate(video_stream.get("r_frame_rate")),
+        "video_codec": video_stream.get("codec_name", ""),
+        "has_audio": audio_stream is not None,
+        "audio_codec": (audio_stream or {}).get("codec_name", ""),
+        "audio_channels": (audio_stream or {}).get("channels"),
+        "audio_channel_layout": (audio_stream or {}).get("channel_layout", ""),
+    }
+
+
+def probe_video(video: Video) -> dict:
+    """
+    Analysiert die Quelldatei und speichert Dauer, Auflösung, Framerate,
+    Codecs und Audio-Layout am Video.
+    """
+    source = probe_source(Path(video.video_file.path))
+
+    video.duration = source["duration"]
+    video.width = source["width"]
+    video.height = source["height"]
+    video.frame_rate = source["fps"]
+    video.video_codec = source["video_codec"]
+    video.audio_codec = source["audio_codec"]
+    video.audio_channels = source["audio_channels"]
+    video.audio_channel_layout = source["audio_channel_layout"]
+    video.save(update_fields=SOURCE_PROBE_FIELDS)
+
+    return source
+
+
+def probe_segment(segment_path: Path) -> dict:
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "stream=codec_type,codec_name,profile,level,width,height",
+        "-of", "json",
+        str(segment_path),
+    ]
+    streams = json.loads(run_ffprobe(cmd)).get("streams", [])
+    video_stream = next((st for st in streams if st.get("codec_type") == "video"), {})
+
+    return {
+        "width": video_stream.get("width"),
+        "height": video_stream.get("height"),
+        "codecs": ",".join(filter(None, (codec_string(st) for st in streams))),
+    }
+
+
+def codec_string(stream: dict) -> str:
+    """RFC 6381 Codec-Bezeichnung für das CODECS-Attribut der Master-Playlist."""
+    if stream.get("codec_name") == "h264":
+        profile = H264_PROFILE_CODES.get(stream.get("profile"), H264_PROFILE_CODES["High"])
+        return f"avc1.{profile}{int(stream.get('level') or 40):02X}"
+    if stream.get("codec_name") == "aac":
+        return AAC_PROFILE_CODES.get(stream.get("profile"), AAC_PROFILE_CODES["LC"])
+    return ""
+
+
+def parse_frame_rate(value: str) -> float:
+    if not value:
+        return 0.0
+    num, _, den = value.partition("/")
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def category_rows_job_id(version: int) -> str:
+    return f"category-rows-{version}"
+
+
+def enqueue_category_rows_job(version: int):
+    """Ein Snapshot-Job pro Katalog-Version, mehrere Änderungen derselben Version reihen nur einen ein."""
+    queue = django_rq.get_queue('default', autocommit=True)
+    return enqueue_unique(queue, materialize_category_rows_job, category_rows_job_id(version), version=version)
+
+
+def materialize_category_rows_job(version: int):
+    """RQ-Job: berechnet die Kategorie-Zeilen der Startseite vor, solange `version` aktuell ist."""
+    materialize_category_rows(version)
+    print(f"Category rows of catalog version {version} materialized")
+
+
+def thumbnail_job_id(video_id: int) -> str:
+    return f"thumb-{video_id}"
+
+
+def enqueue_thumbnail_job(video_id: int):
+    """Ein Vorschaubild-Job pro Video: wartet oder läuft schon einer, wird kein zweiter eingereiht."""
+    queue = django_rq.get_queue('default', autocommit=True)
+    return enqueue_unique(queue, regenerate_thumbnail_job, thumbnail_job_id(video_id), video_id=video_id)
+
+
+def regenerate_thumbnail_job(video_id: int):
+    """RQ-Job: lädt das Video frisch aus der DB und erzeugt fehlende Vorschaubilder."""
+    video = Video.objects.filter(id=video_id).first()
+    if video is None or not video.video_file:
+        print(f"Video {video_id} not found or without source, skipping thumbnail")
+        return None
+    if video.thumbnail:
+        print(f"Video {video_id} already has a thumbnail, skipping")
+        return video.thumbnail.name
+
+    generate_thumbnail_for_video(video)
+    return video.thumbnail.name
+
 
 def generate_thumbnail_for_video(video: Video, input_path: Path = None):
+    """
+    Eigenständiger Dekodier-Durchlauf für Vorschaubilder und Trickplay-Sprites
+    (Modi ohne gemeinsamen Durchlauf mit der HLS-Leiter, Neuerzeugung).
+    """
     if video.thumbnail:
         return
     
     # Wenn kein input_path angegeben, hole es vom Video-Objekt
     if input_path is None:
         input_path = Path(video.video_file.path)
-    
-    thumbnails_dir = Path(getattr(settings, 'MEDIA_ROOT')) / 'thumbnails'
-    thumbnails_dir.mkdir(parents=True, exist_ok=True)
 
-    thumb_filename = f"video_{video.id}.jpg"
-    thumb_abs_path = thumbnails_dir / thumb_filename
+    duration = video.duration or probe_source(input_path)["duration"]
+    output_root = Path(getattr(settings, 'MEDIA_ROOT')) / 'hls' / str(video.id)
+    preview_dir = get_preview_dir(output_root)
 
+    previews = build_preview_graph(preview_dir, duration)
     cmd = [
         "ffmpeg",
         "-y",
-        "-ss", "00:00:01",
         "-i", str(input_path),
-        "-vframes", "1",
-        "-vf", "scale=640:-2",
+        "-filter_complex", f"[0:v]null[{previews['input']}];" + ";".join(previews["filters"]),
+        "-an",
+        *previews["outputs"],
+    ]
+    run_ffmpeg(cmd)
+
+    try:
+        finish_previews(video, input_path, preview_dir, output_root, duration)
+    finally:
+        shutil.rmtree(preview_dir, ignore_errors=True)
+
+
+def previews_in_encode() -> bool:
+    """Im Single-Pass-Modus entstehen die Vorschaubilder im Dekodier-Durchlauf der Leiter."""
+    mode = getattr(settings, "HLS_ENCODING_MODE", HLS_MODE_SINGLE_PASS)
+    return mode not in (HLS_MODE_SEQUENTIAL, HLS_MODE_PROGRESSIVE, HLS_MODE_FANOUT, HLS_MODE_CHUNKED)
+
+
+def build_preview_graph(preview_dir: Path, duration: float) -> dict:
+    """
+    Filter-Zweig für einen vorhandenen Dekodier-Durchlauf: Trickplay-Sprites
+    (fps + tile) und Kandidaten für das Vorschaubild samt signalstats-Werten.
+    """
+    candidate_interval = max(duration / THUMBNAIL_CANDIDATES, 1) if duration else 5
+    stats_path = str(preview_dir / "candidates.txt").replace("\\", "/").replace("'", "")
+    filters = [
+        "[pv]split=2[tp][pc]",
+        f"[tp]fps=1/{TRICKPLAY_INTERVAL},scale={TRICKPLAY_WIDTH}:-2,tile={TRICKPLAY_COLUMNS}x{TRICKPLAY_ROWS}[tpo]",
+        f"[pc]fps=1/{candidate_interval:.3f},scale='min({max(THUMBNAIL_WIDTHS)},iw)':-2,"
+        f"signalstats,metadata=print:file='{stats_path}'[pco]",
+    ]
+    outputs = [
+        "-map", "[tpo]",
+        "-fps_mode", "passthrough",
+        "-c:v", "libwebp",
+        "-quality", "70",
+        "-start_number", "0",
+        "-f", "image2",
+        str(preview_dir / "sprite_%03d.webp"),
+        "-map", "[pco]",
+        "-fps_mode", "passthrough",
+        "-c:v", "mjpeg",
         "-q:v", "2",
-        str(thumb_abs_path)
+        "-start_number", "0",
+        "-f", "image2",
+        str(preview_dir / "candidate_%03d.jpg"),
     ]
+    return {"input": "pv", "filters": filters, "outputs": outputs}
+
+
+def finish_previews(video: Video, input_path: Path, preview_dir: Path, output_root: Path, duration: float):
+    """
+    Wählt das aussagekräftigste Standbild, schreibt es in THUMBNAIL_WIDTHS als
+    WebP, legt den WebVTT-Index der Sprites an und veröffentlicht alles.
+    """
+    candidates = sorted(preview_dir.glob("candidate_*.jpg"))
+    if not candidates:
+        # Sehr kurze Quelle ohne Kandidaten: erstes Bild bei t=0 verwenden
+        candidates = [preview_dir / "candidate_000.jpg"]
+        run_ffmpeg(["ffmpeg", "-y", "-i", str(input_path), "-frames:v", "1", "-q:v", "2", str(candidates[0])])
+    stats = parse_frame_stats(preview_dir / "candidates.txt")
+    best = pick_thumbnail_candidate(stats, len(candidates))
+    sizes = write_thumbnail_sizes(video, candidates[best])
 
+    sprites = sorted(preview_dir.glob("sprite_*.webp"))
+    if sprites and duration:
+        write_trickplay_vtt(preview_dir / TRICKPLAY_VTT, sprites[0], duration)
+    for path in candidates + [preview_dir / "candidates.txt"]:
+        path.unlink(missing_ok=True)
+    commit_staging_dir(preview_dir, output_root / TRICKPLAY_DIR)
+
+    video.has_trickplay = bool(sprites and duration)
+    save_thumbnail_sizes(video, sizes)
+
+
+def parse_frame_stats(stats_path: Path) -> list:
+    """Liest die Ausgabe von metadata=print: ein Dict mit pts_time und signalstats-Werten pro Bild."""
+    frames = []
+    if not stats_path.exists():
+        return frames
+    for line in stats_path.read_text(encoding="utf-8", errors="replace").splitlines():
+        if line.startswith("frame:"):
+            pts_time = line.rsplit("pts_time:", 1)[-1].strip()
+            frames.append({"pts_time": float(pts_time or 0)})
+        elif frames and line.startswith("lavfi.signalstats."):
+            key, _, value = line[len("lavfi.signalstats."):].partition("=")
+            try:
+                frames[-1][key] = float(value)
+            except ValueError:
+                pass
+    return frames
+
+
+def pick_thumbnail_candidate(stats: list, count: int) -> int:
+    """
+    Bewertet jedes Kandidatenbild: Kontrast (YHIGH - YLOW) und Sättigung zählen,
+    Abstand der Helligkeit von der Mitte zieht ab. Schwarz-/Weißbilder
+    (Abblenden, Titelkarten) sowie Anfang und Ende der Quelle fallen heraus.
+    """
+    if count <= 1 or not stats:
+        return 0
+
+    end = max((f["pts_time"] for f in stats), default=0) or 1
+    best, best_score = 0, None
+    for index, frame in enumerate(stats[:count]):
+        brightness = frame.get("YAVG", 128)
+        if brightness < 40 or brightness > 215:
+            continue
+        score = frame.get("YHIGH", 0) - frame.get("YLOW", 0) + 0.5 * frame.get("SATAVG", 0) - 0.25 * abs(brightness - 128)
+        if frame["pts_time"] < 0.03 * end or frame["pts_time"] > 0.97 * end:
+            score -= 100
+        if best_score is None or score > best_score:
+            best, best_score = index, score
+    return best
+
+
+def write_thumbnail_sizes(video: Video, candidate_path: Path) -> dict:
+    """Skaliert das gewählte Standbild in einem ffmpeg-Aufruf auf alle THUMBNAIL_WIDTHS (WebP)."""
+    thumbnails_dir = Path(getattr(settings, 'MEDIA_ROOT')) / 'thumbnails'
+    thumbnails_dir.mkdir(parents=True, exist_ok=True)
+
+    widths = list(THUMBNAIL_WIDTHS)
+    labels = "".join(f"[t{i}]" for i in range(len(widths)))
+    filters = [f"[0:v]split={len(widths)}{labels}"]
+    filters += [f"[t{i}]scale='min({width},iw)':-2[o{i}]" for i, width in enumerate(widths)]
+
+    cmd = ["ffmpeg", "-y", "-i", str(candidate_path), "-filter_complex", ";".join(filters)]
+    sizes = {}
+    for i, width in enumerate(widths):
+        name = f"thumbnails/video_{video.id}_{width}.webp"
+        cmd += ["-map", f"[o{i}]", "-frames:v", "1", "-c:v", "libwebp", "-quality", "80", str(thumbnails_dir.parent / name)]
+        sizes[str(width)] = name
     run_ffmpeg(cmd)
+    return sizes
+
+
+def save_thumbnail_sizes(video: Video, sizes: dict):
+    video.thumbnail_sizes = sizes
+    video.thumbnail.name = sizes.get(str(THUMBNAIL_DEFAULT_WIDTH)) or next(iter(sizes.values()))
+    video.save(update_fields=['thumbnail', 'thumbnail_sizes', 'has_trickplay'])
+
+
+def write_trickplay_vtt(vtt_path: Path, first_sprite: Path, duration: float):
+    """WebVTT-Index: ein Cue pro TRICKPLAY_INTERVAL mit Sprite-Datei und #xywh-Ausschnitt."""
+    sheet = probe_segment(first_sprite)
+    tile_width = (sheet["width"] or TRICKPLAY_WIDTH * TRICKPLAY_COLUMNS) // TRICKPLAY_COLUMNS
+    tile_height = (sheet["height"] or 0) // TRICKPLAY_ROWS
+    per_sheet = TRICKPLAY_COLUMNS * TRICKPLAY_ROWS
+
+    lines = ["WEBVTT", ""]
+    for index in range(math.ceil(duration / TRICKPLAY_INTERVAL)):
+        sheet_index, position = divmod(index, per_sheet)
+        row, column = divmod(position, TRICKPLAY_COLUMNS)
+        start = index * TRICKPLAY_INTERVAL
+        end = min(start + TRICKPLAY_INTERVAL, duration)
+        lines += [
+            f"{format_vtt_time(start)} --> {format_vtt_time(end)}",
+            f"sprite_{sheet_index:03d}.webp#xywh={column * tile_width},{row * tile_height},{tile_width},{tile_height}",
+            "",
+        ]
+    vtt_path.write_text("\n".join(lines), encoding="utf-8")
+
 
-    video.thumbnail.name = f'thumbnails/{thumb_filename}'
-    video.save(update_fields=['thumbnail'])
\ No newline at end of file
+def format_vtt_time(seconds: float) -> str:
+    hours, rest = divmod(seconds, 3600)
+    minutes, rest = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{rest:06.3f}"
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""Resumable chunked uploads: chunks are appended to a part file and hashed as they arrive."""
+import hashlib
+
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.http import UnreadablePostError
+
+from ..models import Video, VideoUpload
+
+
+UPLOAD_DIR = "uploads"
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+HASHER_CACHE_SIZE = 64
+
+# upload id -> (offset, sha256 state) of uploads this process received chunks for
+_hashers = OrderedDict()
+
+
+class UploadConflict(Exception):
+    """The request does not fit the current state of the upload."""
+
+
+class CommittedUpload(File):
+    """
+    Completed part file with its precomputed SHA-256. Storage moves it into
+    place via temporary_file_path() instead of copying it.
+    """
+
+    def __init__(self, path: Path, name: str, sha256: str):
+        super().__init__(open(path, "rb"), name)
+        self.path = str(path)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def get_upload_path(upload: VideoUpload) -> Path:
+    return Path(getattr(settings, "MEDIA_ROOT")) / UPLOAD_DIR / f"{upload.id}.part"
+
+
+def create_upload(**fields) -> VideoUpload:
+    """Register an upload and create its empty part file."""
+    upload = VideoUpload.objects.create(**fields)
+    path = get_upload_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    return upload
+
+
+def get_hasher(upload: VideoUpload, path: Path):
+    """
+    SHA-256 state at the upload's offset. Kept in memory between chunks; a
+    process that did not receive the previous chunk hashes the prefix once.
+    """
+    cached = _hashers.pop(upload.id, None)
+    if cached is not None and cached[0] == upload.offset:
+        return cached[1]
+
+    hasher = hashlib.sha256()
+    remaining = upload.offset
+    with open(path, "rb") as f:
+        while remaining > 0:
+            block = f.read(min(UPLOAD_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            hasher.update(block)
+    return hasher
+
+
+def remember_hasher(upload: VideoUpload, hasher):
+    _hashers[upload.id] = (upload.offset, hasher)
+    while len(_hashers) > HASHER_CACHE_SIZE:
+        _hashers.popitem(last=False)
+
+
+def append_chunk(upload_id, offset: int, stream, length: int = None) -> VideoUpload:
+    """
+    Append the request body at `offset`. The row lock serialises concurrent
+    PATCHes of one upload. If the client disconnects, the bytes received so
+    far are kept and the upload resumes from the new offset.
+    """
+    with transaction.atomic():
+        upload = VideoUpload.objects.select_for_update().get(id=upload_id)
+        if upload.video_id:
+            raise UploadConflict("Upload is already committed.")
+        if offset != upload.offset:
+            raise UploadConflict("Upload-Offset does not match the received bytes.")
+
+        remaining = upload.size - upload.offset
+        if length is not None and length > remaining:
+            raise UploadConflict("Chunk exceeds the announced upload length.")
+
+        path = get_upload_path(upload)
+        hasher = get_hasher(upload, path)
+        written = 0
+        with open(path, "r+b") as f:
+            # Bytes past the recorded offset stem from an interrupted write
+            f.truncate(upload.offset)
+            f.seek(upload.offset)
+            while stream is not None and written < remaining:
+                try:
+                    block = stream.read(min(UPLOAD_BLOCK_SIZE, remaining - written))
+                except (UnreadablePostError, OSError):
+                    break
+                if not block:
+                    break
+                f.write(block)
+                hasher.update(block)
+                written += len(block)
+
+        upload.offset += written
+        upload.save(update_fields=["offset", "updated_at"])
+        remember_hasher(upload, hasher)
+    return upload
+
+
+def commit_upload(upload_id) -> Video:
+    """
+    Move the complete part file into video storage and create the Video,
+    which queues probing and transcoding. Committing twice returns the same video.
+    """
+    with transaction.atomic():
+        upload = VideoUpload.objects.select_for_update().select_related("video").get(id=upload_id)
+        if upload.video is not None:
+            return upload.video
+        if upload.offset != upload.size:
+            raise UploadConflict(f"Upload is incomplete ({upload.offset} of {upload.size} bytes).")
+
+        path = get_upload_path(upload)
+        content_hash = get_hasher(upload, path).hexdigest()
+        _hashers.pop(upload.id, None)
+
+        video = Video(title=upload.title, description=upload.description, category=upload.category)
+        content = CommittedUpload(path, upload.filename, content_hash)
+        try:
+            video.video_file.save(upload.filename, content, save=False)
+        finally:
+            content.close()
+        video.save()
+
+        upload.video = video
+        upload.save(update_fields=["video", "updated_at"])
+    return video
+
+
+def abort_upload(upload: VideoUpload):
+    _hashers.pop(upload.id, None)
+    get_upload_path(upload).unlink(missing_ok=True)
+    upload.delete()
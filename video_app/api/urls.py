@@ -1,9 +1,34 @@
 """URL configuration for video API endpoints."""
+from django.conf import settings
 from django.urls import path
-from .views import VideoListView, VideoHlsPlaylistView, VideoHlsSegmentView
+
+from . import async_views
+from .views import (
+    VideoListView, VideoCategoryRowsView, VideoStatusView, TranscodeQueueStatsView, VideoHlsMasterPlaylistView, VideoHlsPlaylistView, VideoHlsSegmentView,
+    VideoUploadCreateView, VideoUploadDetailView, VideoUploadCommitView, HotCacheStatsView,
+)
+
+# Under ASGI the playback path uses the async views, everything else stays on DRF
+if getattr(settings, "HLS_ASYNC_DELIVERY", False):
+    master_playlist_view = async_views.hls_master_playlist
+    playlist_view = async_views.hls_playlist
+    segment_view = async_views.hls_segment
+else:
+    master_playlist_view = VideoHlsMasterPlaylistView.as_view()
+    playlist_view = VideoHlsPlaylistView.as_view()
+    segment_view = VideoHlsSegmentView.as_view()
 
 urlpatterns = [
     path("video/", VideoListView.as_view(), name="video-list"),
-    path("video/<int:movie_id>/<str:resolution>/index.m3u8", VideoHlsPlaylistView.as_view(), name="video-hls-playlist"),
-    path("video/<int:movie_id>/<str:resolution>/<str:segment>/", VideoHlsSegmentView.as_view(), name="video-hls-segment"),
+    path("video/rows/", VideoCategoryRowsView.as_view(), name="video-category-rows"),
+    path("video/<int:movie_id>/status/", VideoStatusView.as_view(), name="video-status"),
+    path("uploads/", VideoUploadCreateView.as_view(), name="video-upload-create"),
+    path("uploads/<uuid:upload_id>/", VideoUploadDetailView.as_view(), name="video-upload-detail"),
+    path("uploads/<uuid:upload_id>/commit/", VideoUploadCommitView.as_view(), name="video-upload-commit"),
+    path("transcode/queues/", TranscodeQueueStatsView.as_view(), name="transcode-queue-stats"),
+    path("hls/cache/", HotCacheStatsView.as_view(), name="hls-hot-cache-stats"),
+    path("video/<int:movie_id>/master.m3u8", master_playlist_view, name="video-hls-master"),
+    path("video/<int:movie_id>/<str:resolution>/index.m3u8", playlist_view, name="video-hls-playlist"),
+    path("video/<int:movie_id>/trickplay/thumbnails.vtt", segment_view, {"resolution": "trickplay", "segment": "thumbnails.vtt"}, name="video-trickplay"),
+    path("video/<int:movie_id>/<str:resolution>/<str:segment>/", segment_view, name="video-hls-segment"),
 ]
@@ -5,6 +5,10 @@ def get_hls_root_dir(video_id: int) -> Path:
     return Path(getattr(settings, 'MEDIA_ROOT')) / 'hls' / str(video_id)
 
 
+def get_hls_master_playlist_path(video_id: int) -> Path:
+    return get_hls_root_dir(video_id) / 'master.m3u8'
+
+
 def get_hls_variant_dir(video_id: int, resolution: str) -> Path:
     return get_hls_root_dir(video_id) / resolution
 
@@ -1,71 +1,276 @@
 """API views for video listing and HLS streaming."""
-from django.http import FileResponse, Http404
+from django.http import Http404
+from django.urls import reverse
 
+from rest_framework import status
 from rest_framework.views import APIView
+from rest_framework.response import Response
 from rest_framework.generics import ListAPIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.settings import api_settings
 
-from .serializers import VideoListSerializer
-from .services import list_videos_queryset, get_video_by_id
-from .utils import get_hls_variant_playlist_path, get_hls_variant_segment_path
+from .catalog import cached_catalog_response, category_rows_response
+from .delivery import (
+    make_uri_rewriter, playlist_needs_rewrite, playlist_response, rewritten_playlist_response, segment_response,
+)
+from .hotcache import get_hot_cache
+from .manifests import get_manifest_stat
+from .pagination import VideoCursorPagination
+from .scheduler import get_cpu_budget, get_encode_threads, get_queue_stats
+from .serializers import VideoListSerializer, VideoStatusSerializer, VideoUploadSerializer
+from .services import list_videos_queryset, get_video_by_id, get_upload_by_id
+from .signing import (
+    SegmentTokenAuthentication, SegmentTokenUser, get_token_expiry, make_segment_token, signed_urls_enabled,
+)
+from .uploads import UploadConflict, create_upload, append_chunk, commit_upload, abort_upload
+from .utils import get_hls_master_playlist_path, get_hls_variant_playlist_path, get_hls_variant_segment_path
 
 class VideoListView(ListAPIView):
-    """List all available videos."""
+    """List available videos, newest first, in cursor pages."""
     
     permission_classes = [IsAuthenticated]
     serializer_class = VideoListSerializer
+    pagination_class = VideoCursorPagination
 
     def get_queryset(self):
-        """Return queryset of all videos."""
-        return list_videos_queryset()
-    
-    def get_serializer_context(self):
-        """Include request in serializer context."""
-        ctx = super().get_serializer_context()
-        ctx["request"] = self.request
-        return ctx
-    
+        """Return queryset of all videos, optionally of one category (?category=)."""
+        return list_videos_queryset(self.request.query_params.get("category"))
+
+    def list(self, request, *args, **kwargs):
+        """Serve pages from the versioned catalog cache, with ETag / 304."""
+        return cached_catalog_response(request, lambda: super(VideoListView, self).list(request, *args, **kwargs).data)
+
+
+class VideoCategoryRowsView(APIView):
+    """Home-screen rows: the newest videos of every category."""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Return the precomputed rows snapshot of the current catalog version, with ETag / 304."""
+        return category_rows_response(request)
+
+
+class VideoStatusView(APIView):
+    """Report processing state and live transcoding progress of a video."""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, movie_id: int):
+        """Return processing status, published renditions, ffmpeg progress and encode stats."""
+        try:
+            video = get_video_by_id(movie_id)
+        except Exception:
+            raise Http404("Video not found")
+
+        return Response(VideoStatusSerializer(video).data)
+
+
+class TranscodeQueueStatsView(APIView):
+    """Report depth and wait times of the transcode queues."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """Return CPU budget, ffmpeg threads per job and per-queue metrics."""
+        return Response({
+            "cpu_budget": get_cpu_budget(),
+            "encode_threads": get_encode_threads(),
+            "queues": get_queue_stats(),
+        })
+
+
+class HotCacheStatsView(APIView):
+    """Report the hot-content cache of the serving process."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """Return size, hit/miss, eviction and invalidation counters of this worker's cache."""
+        return Response(get_hot_cache().stats())
+
+
+class VideoUploadCreateView(APIView):
+    """Start a resumable chunked upload."""
+
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        """Register title, category, filename and total size; the Location header addresses the chunks."""
+        data = request.data.copy()
+        if "size" not in data and request.headers.get("Upload-Length"):
+            data["size"] = request.headers["Upload-Length"]
+
+        serializer = VideoUploadSerializer(data=data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = create_upload(**serializer.validated_data)
+        response = Response(VideoUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+        response["Location"] = request.build_absolute_uri(reverse("video-upload-detail", kwargs={"upload_id": upload.id}))
+        return upload_headers(response, upload)
+
+
+class VideoUploadDetailView(APIView):
+    """Report, append to or abort a resumable upload."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, upload_id):
+        """Return the upload; HEAD answers with the Upload-Offset to resume from."""
+        upload = get_upload_or_404(upload_id)
+        return upload_headers(Response(VideoUploadSerializer(upload).data), upload)
+
+    def patch(self, request, upload_id):
+        """Append the request body at Upload-Offset, streamed to disk in blocks."""
+        upload = get_upload_or_404(upload_id)
+        if request.content_type != "application/offset+octet-stream":
+            return Response({"detail": "Content-Type must be application/offset+octet-stream."}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        try:
+            offset = int(request.headers["Upload-Offset"])
+        except (KeyError, ValueError):
+            return Response({"detail": "Upload-Offset header is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Without it (chunked transfer encoding) Django exposes no request body
+            length = int(request.headers["Content-Length"])
+        except (KeyError, ValueError):
+            return Response({"detail": "Content-Length header is required."}, status=status.HTTP_411_LENGTH_REQUIRED)
+
+        try:
+            upload = append_chunk(upload.id, offset, request.stream, length)
+        except UploadConflict as exc:
+            upload.refresh_from_db()
+            return upload_headers(Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT), upload)
+        return upload_headers(Response(status=status.HTTP_204_NO_CONTENT), upload)
+
+    def delete(self, request, upload_id):
+        """Abort an upload and remove the received bytes."""
+        upload = get_upload_or_404(upload_id)
+        if upload.video_id:
+            return Response({"detail": "Upload is already committed."}, status=status.HTTP_409_CONFLICT)
+        abort_upload(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class VideoUploadCommitView(APIView):
+    """Turn a complete upload into a video and start processing."""
+
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, upload_id):
+        """Create the video from the uploaded file; probing and transcoding are queued right away."""
+        upload = get_upload_or_404(upload_id)
+        try:
+            video = commit_upload(upload.id)
+        except UploadConflict as exc:
+            upload.refresh_from_db()
+            return upload_headers(Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT), upload)
+
+        return Response({
+            "video_id": video.id,
+            "source_hash": video.source_hash,
+            "status_url": request.build_absolute_uri(reverse("video-status", kwargs={"movie_id": video.id})),
+        }, status=status.HTTP_201_CREATED)
+
+
+def get_upload_or_404(upload_id):
+    try:
+        return get_upload_by_id(upload_id)
+    except Exception:
+        raise Http404("Upload not found")
+
+
+def upload_headers(response, upload):
+    response["Upload-Offset"] = str(upload.offset)
+    response["Upload-Length"] = str(upload.size)
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+class VideoHlsMasterPlaylistView(APIView):
+    """Serve the HLS master playlist for adaptive bitrate streaming."""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, movie_id: int):
+        """Return master.m3u8, with variant URIs rewritten per request for signed or CDN URLs."""
+        try:
+            video = get_video_by_id(movie_id)
+        except Exception:
+            raise Http404("Video not found")
+
+        master_path = get_hls_master_playlist_path(movie_id)
+        if not master_path.exists():
+            raise Http404("Playlist not found")
+
+        if playlist_needs_rewrite():
+            token_for = None
+            if signed_urls_enabled():
+                expires = get_token_expiry(video.duration)
+                token_for = lambda rendition: make_segment_token(request.user.id, movie_id, rendition, expires)
+            return rewritten_playlist_response(master_path, make_uri_rewriter(movie_id, token_for=token_for), "master.m3u8")
+        return playlist_response(request, master_path, "master.m3u8")
+
 
 class VideoHlsPlaylistView(APIView):
     """Serve HLS playlist files for video streaming."""
     
+    authentication_classes = [SegmentTokenAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, movie_id: int, resolution: str):
-        """Return HLS playlist file for specified video and resolution."""
+        """Return HLS playlist file for specified video and resolution, with signed or CDN segment URIs if configured."""
         try:
-            get_video_by_id(movie_id)
+            video = get_video_by_id(movie_id)
         except Exception:
             raise Http404("Video not found")
         
+        # The segment manifest answers for existence, size and validators without a stat
         playlist_path = get_hls_variant_playlist_path(movie_id, resolution)
-        if not playlist_path.exists():
+        try:
+            stat = get_manifest_stat(movie_id, resolution, "index.m3u8")
+        except FileNotFoundError:
+            raise Http404("Playlist not found")
+        if stat is None and not playlist_path.exists():
             raise Http404("Playlist not found")
         
-        response = FileResponse(open(playlist_path, 'rb'), content_type='application/vnd.apple.mpegurl')
-        response["Content-Disposition"] = "inline; filename=index.m3u8"
-        return response
+        try:
+            if playlist_needs_rewrite():
+                token = make_segment_token(request.user.id, movie_id, resolution, get_token_expiry(video.duration)) if signed_urls_enabled() else None
+                return rewritten_playlist_response(playlist_path, make_uri_rewriter(movie_id, resolution, lambda rendition: token))
+            return playlist_response(request, playlist_path, stat=stat)
+        except FileNotFoundError:
+            raise Http404("Playlist not found")
     
     
 class VideoHlsSegmentView(APIView):
     """Serve HLS video segments for streaming."""
     
+    authentication_classes = [SegmentTokenAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, movie_id: int, resolution: str, segment: str):
-        """Return HLS video segment file for specified video, resolution, and segment."""
-        try:
-            get_video_by_id(movie_id)
-        except Exception:
-            raise Http404("Video not found")
+        """Return HLS segment, init section or single-file rendition, honouring Range requests."""
+        # A signed token already binds user, video and rendition: no database access
+        if not isinstance(request.user, SegmentTokenUser):
+            try:
+                get_video_by_id(movie_id)
+            except Exception:
+                raise Http404("Video not found")
         
         if "/" in segment or "\\" in segment:
             raise Http404("Segment not found")
         
+        # Names the manifest does not list are rejected without touching the disk
+        try:
+            stat = get_manifest_stat(movie_id, resolution, segment)
+        except FileNotFoundError:
+            raise Http404("Segment not found")
         segment_path = get_hls_variant_segment_path(movie_id, resolution, segment)
-        if not segment_path.exists():
+        if stat is None and not segment_path.exists():
             raise Http404("Segment not found")
         
-        response = FileResponse(open(segment_path, 'rb'), content_type='video/MP2T')
-        response["Content-Disposition"] = f"inline; filename={segment}"
-        return response
\ No newline at end of file
+        try:
+            return segment_response(request, segment_path, segment, stat)
+        except FileNotFoundError:
+            raise Http404("Segment not found")
@@ -0,0 +1,51 @@
+"""Model fields for video content management."""
+import hashlib
+
+from django.core.files import File
+from django.db import models
+from django.db.models.fields.files import FieldFile
+
+
+class HashingFile(File):
+    """File wrapper that feeds every chunk read by the storage into a SHA-256 digest."""
+
+    def __init__(self, file, name=None):
+        super().__init__(file, name)
+        self.hasher = hashlib.sha256()
+
+    def chunks(self, chunk_size=None):
+        for chunk in super().chunks(chunk_size):
+            self.hasher.update(chunk)
+            yield chunk
+
+
+class HashedFieldFile(FieldFile):
+    """Stores the upload and records its SHA-256 in the model's hash field in the same pass."""
+
+    def save(self, name, content, save=True):
+        content_hash = getattr(content, "sha256", None)
+        if content_hash is None:
+            # Wrapping hides temporary_file_path(), so the storage streams the
+            # upload through chunks() instead of moving it unread.
+            content = HashingFile(content, getattr(content, "name", name))
+
+        super().save(name, content, save=False)
+
+        setattr(self.instance, self.field.hash_field, content_hash or content.hasher.hexdigest())
+        if save:
+            self.instance.save()
+
+
+class HashedFileField(models.FileField):
+    """FileField that hashes the content while it is written to storage."""
+
+    attr_class = HashedFieldFile
+
+    def __init__(self, *args, hash_field="source_hash", **kwargs):
+        self.hash_field = hash_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["hash_field"] = self.hash_field
+        return name, path, args, kwargs
@@ -0,0 +1,181 @@
+"""Benchmark concurrent viewers on the async (ASGI) and sync (WSGI) segment views."""
+import asyncio, queue, statistics, threading, time, tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+from rest_framework.test import force_authenticate
+
+from video_app.api import async_views, hotcache
+from video_app.api.playlists import parse_media_playlist
+from video_app.api.signing import SEGMENT_TOKEN_PARAM, get_token_expiry, make_segment_token
+from video_app.api.utils import get_hls_root_dir, get_hls_variant_playlist_path
+from video_app.api.views import VideoHlsSegmentView
+from video_app.models import Video
+
+
+class Command(BaseCommand):
+    """
+    Simulate viewers that arrive at once and download segments at a limited
+    client bandwidth. A sync worker is blocked while its client receives the
+    body; the async view only awaits the (simulated) send.
+    """
+
+    help = "Compare p99 latency and memory of async and sync segment delivery under many concurrent viewers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--video", type=int, help="Video to serve (default: newest ready video).")
+        parser.add_argument("--rendition", help="Rendition to serve (default: lowest).")
+        parser.add_argument("--viewers", type=int, default=1000, help="Concurrent simulated viewers.")
+        parser.add_argument("--segments", type=int, default=1, help="Segments each viewer downloads one after another.")
+        parser.add_argument("--client-mbps", type=float, default=50.0, help="Download bandwidth of every viewer.")
+        parser.add_argument("--wsgi-workers", type=int, default=4, help="Sync workers (gunicorn processes x threads).")
+        parser.add_argument("--modes", default="asgi,wsgi", help="Comma separated modes to run.")
+        parser.add_argument("--hot-cache", action="store_true", help="Keep the in-process hot cache enabled.")
+        parser.add_argument("--skip-memory", action="store_true", help="Skip the second, traced pass that measures peak memory.")
+
+    def handle(self, *args, **options):
+        video = self.get_video(options["video"])
+        rendition = options["rendition"] or video.hls_variants[0]["name"]
+        segments = [segment["uri"] for segment in parse_media_playlist(get_hls_variant_playlist_path(video.id, rendition))]
+        self.video_id, self.rendition, self.segments = video.id, rendition, segments
+        self.token = make_segment_token(0, video.id, rendition, get_token_expiry(video.duration))
+        self.bytes_per_second = options["client_mbps"] * 1_000_000 / 8
+
+        self.stdout.write(f"{options['viewers']} viewers x {options['segments']} segments of video {video.id} / {rendition} "
+                          f"at {options['client_mbps']:g} Mbps each")
+
+        saved_cache = hotcache._hot_cache
+        if not options["hot_cache"]:
+            hotcache._hot_cache = hotcache.HotCache(0, 0)
+
+        results = []
+        try:
+            with override_settings(HLS_DELIVERY_MODE="django"):
+                for mode in [m.strip() for m in options["modes"].split(",") if m.strip()]:
+                    if mode not in ("asgi", "wsgi"):
+                        raise CommandError(f"Unknown mode {mode}.")
+                    started = time.perf_counter()
+                    latencies = self.run_mode(mode, options)
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f"{mode}: {elapsed:.1f}s")
+
+                    # tracemalloc slows the run down, so memory is measured in a second pass
+                    peak = None
+                    if not options["skip_memory"]:
+                        tracemalloc.start()
+                        self.run_mode(mode, options)
+                        peak = tracemalloc.get_traced_memory()[1]
+                        tracemalloc.stop()
+
+                    in_flight = options["viewers"] if mode == "asgi" else options["wsgi_workers"]
+                    results.append((mode, in_flight, elapsed, latencies, peak))
+        finally:
+            hotcache._hot_cache = saved_cache
+
+        self.print_results(results)
+
+    def run_mode(self, mode: str, options) -> list:
+        if mode == "asgi":
+            return asyncio.run(self.run_asgi(options["viewers"], options["segments"]))
+        return self.run_wsgi(options["viewers"], options["segments"], options["wsgi_workers"])
+
+    def print_results(self, results):
+        self.stdout.write("")
+        self.stdout.write(f"{'mode':<6}{'in flight':>10}{'total s':>9}{'req/s':>8}{'p50 s':>8}{'p99 s':>8}{'max s':>8}"
+                          f"{'peak MB':>9}{'KB/stream':>11}")
+        for mode, in_flight, elapsed, latencies, peak in results:
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            memory = f"{peak / 1e6:>9.1f}{peak / in_flight / 1e3:>11.0f}" if peak is not None else f"{'-':>9}{'-':>11}"
+            self.stdout.write(
+                f"{mode:<6}{in_flight:>10}{elapsed:>9.1f}{len(latencies) / elapsed:>8.0f}{statistics.median(latencies):>8.2f}"
+                f"{p99:>8.2f}{latencies[-1]:>8.2f}{memory}"
+            )
+
+    def get_video(self, video_id):
+        videos = Video.objects.filter(processing_status=Video.ProcessingStatus.READY).order_by("-created_at")
+        if video_id:
+            videos = videos.filter(id=video_id)
+        for video in videos:
+            if video.hls_variants and get_hls_root_dir(video.id).exists():
+                return video
+        raise CommandError("No ready video with HLS output found.")
+
+    def segment_url(self, segment: str) -> str:
+        return f"/api/video/{self.video_id}/{self.rendition}/{segment}/?{SEGMENT_TOKEN_PARAM}={self.token}"
+
+    async def run_asgi(self, viewers: int, segments: int) -> list:
+        factory = AsyncRequestFactory()
+
+        async def viewer(index):
+            latencies = []
+            for i in range(segments):
+                segment = self.segments[(index + i) % len(self.segments)]
+                started = time.perf_counter()
+                response = await async_views.hls_segment(
+                    factory.get(self.segment_url(segment)), movie_id=self.video_id, resolution=self.rendition, segment=segment
+                )
+                if response.streaming:
+                    async for chunk in response:
+                        # The ASGI server awaits send(); a slow client delays the next read
+                        await asyncio.sleep(len(chunk) / self.bytes_per_second)
+                else:
+                    await asyncio.sleep(len(response.content) / self.bytes_per_second)
+                latencies.append(time.perf_counter() - started)
+            return latencies
+
+        results = await asyncio.gather(*(viewer(index) for index in range(viewers)))
+        return [latency for latencies in results for latency in latencies]
+
+    def run_wsgi(self, viewers: int, segments: int, workers: int) -> list:
+        """
+        Each viewer's requests queue for a free worker like connections in
+        gunicorn's backlog; a viewer queues its next segment once the previous
+        one has arrived. Latency runs from queueing to the last byte.
+        """
+        factory = RequestFactory()
+        view = VideoHlsSegmentView.as_view()
+        user = get_user_model()(username="benchmark")
+        backlog = queue.Queue()
+        lock = threading.Lock()
+        latencies = []
+
+        def request(segment):
+            req = factory.get(self.segment_url(segment))
+            force_authenticate(req, user=user)
+            response = view(req, movie_id=self.video_id, resolution=self.rendition, segment=segment)
+            pending = 0.0
+            for chunk in (response.streaming_content if response.streaming else [response.content]):
+                # The sync worker writes to the socket and is blocked until the client has read it
+                pending += len(chunk) / self.bytes_per_second
+                if pending >= 0.01:
+                    time.sleep(pending)
+                    pending = 0.0
+            time.sleep(pending)
+            response.close()
+
+        def worker():
+            while (item := backlog.get()) is not None:
+                index, i, queued = item
+                try:
+                    request(self.segments[(index + i) % len(self.segments)])
+                    with lock:
+                        latencies.append(time.perf_counter() - queued)
+                    if i + 1 < segments:
+                        backlog.put((index, i + 1, time.perf_counter()))
+                finally:
+                    backlog.task_done()
+
+        queued = time.perf_counter()
+        for index in range(viewers):
+            backlog.put((index, 0, queued))
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        backlog.join()
+        for thread in threads:
+            backlog.put(None)
+        for thread in threads:
+            thread.join()
+        return latencies
@@ -0,0 +1,122 @@
+"""Benchmark the video catalog endpoint on a growing synthetic catalog."""
+import statistics, time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from rest_framework.test import force_authenticate
+
+from video_app.api.catalog import bump_catalog_version
+from video_app.api.pagination import VideoCursorPagination
+from video_app.api.serializers import VideoListSerializer
+from video_app.api.services import list_videos_queryset
+from video_app.api.views import VideoListView
+from video_app.models import Video
+
+
+BATCH_SIZE = 5000
+
+
+class _Rollback(Exception):
+    """Leaves the synthetic catalog out of the database."""
+
+
+class Command(BaseCommand):
+    """
+    Grow a synthetic catalog step by step and time the first page, a page 90%
+    deep, a category page and (up to --legacy-max rows) the old unpaginated
+    list and an OFFSET page at the same depth. Runs in a rolled back transaction
+    with the catalog cache off, so every request hits the database.
+    """
+
+    help = "Show that cursor pages of GET /api/video/ stay flat while the catalog grows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000", help="Comma separated catalog sizes.")
+        parser.add_argument("--requests", type=int, default=30, help="Requests per measurement.")
+        parser.add_argument("--page-size", type=int, default=24)
+        parser.add_argument("--categories", type=int, default=12)
+        parser.add_argument("--legacy-max", type=int, default=10000,
+                            help="Largest catalog for which the unpaginated list is timed.")
+        parser.add_argument("--explain", action="store_true", help="Print the query plan of the deep page.")
+
+    def handle(self, *args, **options):
+        self.factory = RequestFactory(HTTP_HOST=(settings.ALLOWED_HOSTS or ["localhost"])[0])
+        self.user = get_user_model()(username="benchmark")
+        self.view = VideoListView.as_view()
+        self.options = options
+
+        sizes = sorted(int(size) for size in options["sizes"].split(","))
+        self.stdout.write(f"{'rows':>9}{'first ms':>10}{'deep ms':>10}{'category ms':>13}{'offset ms':>11}{'unpaged ms':>12}")
+        # bulk_create sends no post_save, a new version keeps synthetic pages out of the cache
+        bump_catalog_version()
+        try:
+            with override_settings(CATALOG_CACHE_TTL=0), transaction.atomic():
+                created = Video.objects.count()
+                for size in sizes:
+                    self.grow_catalog(created, size)
+                    created = max(created, size)
+                    self.stdout.write(self.measure(size))
+                raise _Rollback()
+        except _Rollback:
+            pass
+        finally:
+            bump_catalog_version()
+
+    def grow_catalog(self, start: int, size: int):
+        categories = self.options["categories"]
+        for offset in range(start, size, BATCH_SIZE):
+            Video.objects.bulk_create([
+                Video(
+                    title=f"Synthetic video {i}", description="Synthetic catalog entry", category=f"Category {i % categories}",
+                    video_file="videos/synthetic.mp4", processing_status=Video.ProcessingStatus.READY,
+                    hls_variants=[{"name": "480p", "width": 854, "height": 480, "bandwidth": 1_400_000}],
+                )
+                for i in range(offset, min(offset + BATCH_SIZE, size))
+            ])
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Video._meta.db_table}")
+
+    def measure(self, size: int) -> str:
+        page_size = self.options["page_size"]
+        depth = int(size * 0.9)
+        deep = list_videos_queryset()[depth]
+        cursor = VideoCursorPagination().encode_cursor(deep)
+
+        first = self.time_view({"page_size": page_size})
+        deep_ms = self.time_view({"page_size": page_size, "cursor": cursor})
+        category = self.time_view({"page_size": page_size, "category": "Category 1"})
+        context = {"request": self.factory.get("/api/video/")}
+        offset = self.time_call(lambda: VideoListSerializer(list_videos_queryset()[depth:depth + page_size], many=True, context=context).data)
+        unpaged = None
+        if size <= self.options["legacy_max"]:
+            unpaged = self.time_call(lambda: VideoListSerializer(list_videos_queryset(), many=True, context=context).data, repeat=3)
+
+        if self.options["explain"]:
+            pagination = VideoCursorPagination()
+            pagination.page_size = page_size
+            self.stdout.write(pagination.get_page_queryset(list_videos_queryset(), (deep.created_at, deep.id, False)).explain())
+
+        unpaged = f"{unpaged:>12.1f}" if unpaged is not None else f"{'-':>12}"
+        return f"{size:>9}{first:>10.1f}{deep_ms:>10.1f}{category:>13.1f}{offset:>11.1f}{unpaged}"
+
+    def time_view(self, params: dict) -> float:
+        def call():
+            request = self.factory.get("/api/video/", params)
+            force_authenticate(request, user=self.user)
+            response = self.view(request)
+            assert response.status_code == 200, response.data
+            return response.render()
+        return self.time_call(call)
+
+    def time_call(self, call, repeat: int = None) -> float:
+        """Median wall time of `call` in milliseconds."""
+        timings = []
+        for _ in range(repeat or self.options["requests"]):
+            started = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,87 @@
+"""Benchmark HLS segment delivery in-process against offloading to the front proxy."""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from rest_framework.test import force_authenticate
+
+from video_app.api.playlists import parse_media_playlist
+from video_app.api.utils import get_hls_root_dir, get_hls_variant_playlist_path
+from video_app.api.views import VideoHlsSegmentView
+from video_app.models import Video
+
+
+class Command(BaseCommand):
+    """Measure requests/sec and gunicorn worker occupancy per delivery mode."""
+
+    help = "Compare in-process segment streaming with X-Accel-Redirect / X-Sendfile offloading."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--video", type=int, help="Video to serve (default: newest ready video).")
+        parser.add_argument("--rendition", help="Rendition to serve (default: highest).")
+        parser.add_argument("--requests", type=int, default=200, help="Segment requests per mode.")
+        parser.add_argument("--modes", default="django,x-accel", help="Comma separated delivery modes to run.")
+        parser.add_argument("--client-mbps", type=float, default=10.0,
+                            help="Client bandwidth used to model how long a sync worker stays busy sending the body.")
+
+    def handle(self, *args, **options):
+        video = self.get_video(options["video"])
+        rendition = options["rendition"] or video.hls_variants[-1]["name"]
+        # Only files the playlist references, not segments.json or other sidecar files
+        playlist = parse_media_playlist(get_hls_variant_playlist_path(video.id, rendition))
+        segments = list(dict.fromkeys(segment["uri"] for segment in playlist))
+        if not segments:
+            raise CommandError(f"No segments found for video {video.id} / {rendition}.")
+
+        self.stdout.write(f"Serving {options['requests']} requests from video {video.id} / {rendition} ({len(segments)} files)...")
+        results = []
+        for mode in [m.strip() for m in options["modes"].split(",") if m.strip()]:
+            with override_settings(HLS_DELIVERY_MODE=mode):
+                results.append((mode, *self.run_mode(mode, video.id, rendition, segments, options["requests"])))
+
+        self.print_results(results, options["client_mbps"])
+
+    def get_video(self, video_id):
+        videos = Video.objects.filter(processing_status=Video.ProcessingStatus.READY).order_by("-created_at")
+        if video_id:
+            videos = videos.filter(id=video_id)
+        for video in videos:
+            if video.hls_variants and get_hls_root_dir(video.id).exists():
+                return video
+        raise CommandError("No ready video with HLS output found.")
+
+    def run_mode(self, mode, video_id, rendition, segments, count):
+        """Call the segment view and drain each response the way the WSGI server would."""
+        factory = RequestFactory()
+        user = get_user_model()(username="benchmark")
+        view = VideoHlsSegmentView.as_view()
+
+        body_bytes = 0
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        for i in range(count):
+            segment = segments[i % len(segments)]
+            request = factory.get(f"/api/video/{video_id}/{rendition}/{segment}/")
+            force_authenticate(request, user=user)
+            response = view(request, movie_id=video_id, resolution=rendition, segment=segment)
+            if response.status_code not in (200, 206):
+                raise CommandError(f"GET {segment} returned {response.status_code} in mode {mode}.")
+            body = response.streaming_content if response.streaming else [response.content]
+            body_bytes += sum(len(chunk) for chunk in body)
+            response.close()
+        wall = time.perf_counter() - wall_started
+        cpu = time.process_time() - cpu_started
+        return count, wall, cpu, body_bytes
+
+    def print_results(self, results, client_mbps):
+        bytes_per_second = client_mbps * 1_000_000 / 8
+        self.stdout.write("")
+        self.stdout.write(f"{'mode':<12}{'req/s':>10}{'ms/req':>10}{'cpu ms/req':>12}{'MB via worker':>15}"
+                          f"{'busy ms/req @' + format(client_mbps, 'g') + 'Mbps':>24}{'req/s/worker':>14}")
+        for mode, count, wall, cpu, body_bytes in results:
+            # A sync worker is blocked until the client has received the whole body
+            busy = wall / count + body_bytes / count / bytes_per_second
+            self.stdout.write(
+                f"{mode:<12}{count / wall:>10.0f}{wall / count * 1000:>10.2f}{cpu / count * 1000:>12.2f}"
+                f"{body_bytes / 1e6:>15.1f}{busy * 1000:>24.1f}{1 / busy:>14.1f}"
+            )
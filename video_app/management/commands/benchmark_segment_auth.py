@@ -0,0 +1,88 @@
+"""Benchmark segment requests authenticated by JWT cookie against signed segment URLs."""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from video_app.api.playlists import parse_media_playlist
+from video_app.api.delivery import make_uri_rewriter
+from video_app.api.signing import get_token_expiry, make_segment_token
+from video_app.api.utils import get_hls_root_dir, get_hls_variant_playlist_path
+from video_app.models import Video
+
+
+class Command(BaseCommand):
+    """Measure requests/sec and database queries per segment request for both authentication paths."""
+
+    help = "Compare JWT cookie authentication with signed segment URLs on the segment endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--video", type=int, help="Video to serve (default: newest ready video).")
+        parser.add_argument("--rendition", help="Rendition to serve (default: highest).")
+        parser.add_argument("--user", help="Username to authenticate as (default: first active user).")
+        parser.add_argument("--requests", type=int, default=500, help="Segment requests per mode.")
+        parser.add_argument("--delivery", default="x-accel",
+                            help="Delivery mode during the run; x-accel keeps file transfer out of the measurement.")
+
+    def handle(self, *args, **options):
+        video = self.get_video(options["video"])
+        rendition = options["rendition"] or video.hls_variants[-1]["name"]
+        user = self.get_user(options["user"])
+        segments = [segment["uri"] for segment in parse_media_playlist(get_hls_variant_playlist_path(video.id, rendition))]
+        token = make_segment_token(user.id, video.id, rendition, get_token_expiry(video.duration))
+
+        client = Client(HTTP_HOST=(settings.ALLOWED_HOSTS or ["localhost"])[0])
+        client.cookies["access_token"] = str(AccessToken.for_user(user))
+        base = f"/api/video/{video.id}/{rendition}/"
+
+        self.stdout.write(f"{options['requests']} requests per mode, video {video.id} / {rendition}, user {user}")
+        results = []
+        with override_settings(HLS_DELIVERY_MODE=options["delivery"], HLS_CDN_BASE_URL=""):
+            sign = make_uri_rewriter(video.id, rendition, lambda rendition: token)
+            results.append(self.run_mode("jwt", client, [f"{base}{uri}/" for uri in segments], options["requests"]))
+            results.append(self.run_mode("signed", client, [base + sign(uri) for uri in segments],
+                                         options["requests"], cookies=False))
+
+        self.stdout.write("")
+        self.stdout.write(f"{'mode':<10}{'req/s':>10}{'ms/req':>10}{'queries/req':>14}{'errors':>8}")
+        for mode, count, elapsed, queries, errors in results:
+            self.stdout.write(f"{mode:<10}{count / elapsed:>10.0f}{elapsed / count * 1000:>10.2f}{queries / count:>14.2f}{errors:>8}")
+
+    def get_video(self, video_id):
+        videos = Video.objects.filter(processing_status=Video.ProcessingStatus.READY).order_by("-created_at")
+        if video_id:
+            videos = videos.filter(id=video_id)
+        for video in videos:
+            if video.hls_variants and get_hls_root_dir(video.id).exists():
+                return video
+        raise CommandError("No ready video with HLS output found.")
+
+    def get_user(self, username):
+        users = get_user_model().objects.filter(is_active=True)
+        user = users.filter(username=username).first() if username else users.order_by("id").first()
+        if user is None:
+            raise CommandError("No active user found.")
+        return user
+
+    def run_mode(self, mode, client, urls, count, cookies=True):
+        saved_cookies = client.cookies
+        if not cookies:
+            client.cookies = type(saved_cookies)()
+
+        errors = 0
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for i in range(count):
+                response = client.get(urls[i % len(urls)])
+                if response.status_code != 200:
+                    errors += 1
+                response.close()
+            elapsed = time.perf_counter() - started
+
+        client.cookies = saved_cookies
+        return mode, count, elapsed, len(queries), errors
@@ -0,0 +1,138 @@
+"""Benchmark HLS encoding and audio modes on a synthetic ffmpeg-generated source."""
+import shutil, tempfile, time
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from video_app.api.tasks import (
+    HLS_AUDIO_RENDITION,
+    HLS_AUDIO_SHARED,
+    HLS_VARIANTS,
+    analyze_complexity,
+    apply_encoding_profile,
+    build_encoding_profile,
+    encode_variants_sequential,
+    encode_variants_single_pass,
+    get_chunk_dir,
+    plan_chunks,
+    probe_source,
+    run_ffmpeg,
+    stitch_chunks,
+    transcode_chunk,
+)
+
+
+class Command(BaseCommand):
+    """Compare wall-clock time and output size of the encoding pipelines and audio modes."""
+
+    help = "Compare HLS encoding and audio modes on a synthetic source."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--duration", type=int, default=300, help="Length of the synthetic source in seconds.")
+        parser.add_argument("--size", default="1920x1080", help="Resolution of the synthetic source.")
+        parser.add_argument("--fps", type=int, default=25, help="Frame rate of the synthetic source.")
+        parser.add_argument("--workers", type=int, default=4, help="Parallel chunk encoders (simulated RQ workers).")
+        parser.add_argument("--chunk-seconds", type=int, default=60, help="Target chunk length for the chunked mode.")
+        parser.add_argument("--modes", default="sequential,single_pass,chunked", help="Comma separated modes to run.")
+        parser.add_argument("--audio-modes", default="muxed", help="Comma separated audio modes to run (muxed, shared).")
+        parser.add_argument("--input", help="Use an existing video instead of the synthetic source.")
+        parser.add_argument("--per-title", action="store_true", help="Apply a per-title encoding profile to the ladder.")
+        parser.add_argument("--keep", action="store_true", help="Keep the working directory.")
+
+    def handle(self, *args, **options):
+        workdir = Path(tempfile.mkdtemp(prefix="hls-bench-"))
+
+        if options["input"]:
+            source = Path(options["input"])
+            probe = probe_source(source)
+            options["duration"], options["fps"] = probe["duration"], probe["fps"]
+        else:
+            source = workdir / "source.mp4"
+            self.stdout.write(f"Generating {options['duration']}s {options['size']}@{options['fps']} source in {workdir}...")
+            self.generate_source(source, options["duration"], options["size"], options["fps"])
+
+        self.variants = list(HLS_VARIANTS)
+        if options["per_title"]:
+            height = probe_source(source)["height"]
+            profile = build_encoding_profile(analyze_complexity(source, options["duration"]), height)
+            self.variants = apply_encoding_profile(self.variants, profile)
+            self.stdout.write(f"Per-title profile: {profile['analysis_kbps']} kbps at {profile['analysis_height']}p, "
+                              + ", ".join(f"{name} maxrate {rung['maxrate']}" for name, rung in profile["rungs"].items()))
+
+        results = []
+        try:
+            for mode in self.split_option(options["modes"]):
+                for audio_mode in self.split_option(options["audio_modes"]):
+                    output_root = workdir / f"{mode}-{audio_mode}"
+                    output_root.mkdir()
+
+                    started = time.perf_counter()
+                    getattr(self, f"run_{mode}")(source, output_root, options, audio_mode == HLS_AUDIO_SHARED)
+                    elapsed = time.perf_counter() - started
+
+                    results.append((mode, audio_mode, elapsed, *self.output_stats(output_root), options["duration"]))
+                    self.stdout.write(f"{mode}/{audio_mode}: {elapsed:.1f}s")
+        finally:
+            if not options["keep"]:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        self.print_results(results)
+
+    def split_option(self, value: str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+
+    def generate_source(self, path: Path, duration: int, size: str, fps: int):
+        run_ffmpeg([
+            "ffmpeg", "-y",
+            "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={fps}",
+            "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+            "-t", str(duration),
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "20",
+            "-c:a", "aac", "-b:a", "128k",
+            "-shortest",
+            str(path),
+        ])
+
+    def run_sequential(self, source: Path, output_root: Path, options: dict, shared_audio: bool):
+        encode_variants_sequential(0, source, output_root, self.variants, shared_audio)
+
+    def run_single_pass(self, source: Path, output_root: Path, options: dict, shared_audio: bool):
+        encode_variants_single_pass(0, source, output_root, self.variants, True, shared_audio)
+
+    def run_chunked(self, source: Path, output_root: Path, options: dict, shared_audio: bool):
+        chunks = plan_chunks(options["duration"], options["fps"], options["chunk_seconds"])
+        chunk_dirs = [get_chunk_dir(output_root, index) for index in range(len(chunks))]
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = [
+                pool.submit(transcode_chunk, source, chunk_dir, self.variants, start, duration, True, shared_audio)
+                for chunk_dir, (start, duration) in zip(chunk_dirs, chunks)
+            ]
+            for future in futures:
+                future.result()
+
+        renditions = list(self.variants) + ([HLS_AUDIO_RENDITION] if shared_audio else [])
+        stitch_chunks(output_root, chunk_dirs, renditions)
+
+    def output_stats(self, output_root: Path):
+        segments = [
+            p for p in output_root.rglob("*")
+            if p.is_file() and p.suffix != ".m3u8" and "_chunks" not in p.parts
+        ]
+        return len(segments), sum(p.stat().st_size for p in segments)
+
+    def print_results(self, results: list):
+        if not results:
+            return
+        baseline = results[0][2]
+        self.stdout.write("")
+        self.stdout.write(f"{'mode':<14}{'audio':<8}{'wall time':>12}{'speedup':>10}{'segments':>10}{'size':>12}{'per hour':>12}")
+        for mode, audio_mode, elapsed, segment_count, size, duration in results:
+            # Alle Stufen zusammen, pro Stunde Quellmaterial
+            per_hour = size / duration * 3600 if duration else 0
+            self.stdout.write(
+                f"{mode:<14}{audio_mode:<8}{elapsed:>11.1f}s{baseline / elapsed:>9.2f}x{segment_count:>10}"
+                f"{size / 1024 / 1024:>10.1f}MB{per_hour / 1024 / 1024:>10.0f}MB"
+            )
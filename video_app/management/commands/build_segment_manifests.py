@@ -0,0 +1,36 @@
+"""Write segment manifests for renditions published before the pipeline emitted them."""
+from django.core.management.base import BaseCommand
+
+from video_app.api.manifests import is_manifest_current, write_segment_manifest
+from video_app.api.tasks import is_playlist_complete
+from video_app.api.utils import get_hls_variant_dir
+from video_app.models import Video
+
+
+class Command(BaseCommand):
+    """Backfill segments.json (and its Redis copy) for every finished rendition."""
+
+    help = "Build missing or outdated segment manifests of published renditions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--video", type=int, action="append", help="Only this video (repeatable).")
+        parser.add_argument("--force", action="store_true", help="Rebuild manifests that are up to date.")
+
+    def handle(self, *args, **options):
+        videos = Video.objects.exclude(hls_variants=[]).order_by("id")
+        if options["video"]:
+            videos = videos.filter(id__in=options["video"])
+
+        written = 0
+        for video in videos.iterator():
+            for variant in video.hls_variants or []:
+                variant_dir = get_hls_variant_dir(video.id, variant["name"])
+                if not is_playlist_complete(variant_dir / "index.m3u8"):
+                    continue
+                if is_manifest_current(variant_dir) and not options["force"]:
+                    continue
+                manifest = write_segment_manifest(video.id, variant_dir)
+                written += 1
+                self.stdout.write(f"Video {video.id} / {variant['name']}: {len(manifest['segments'])} segments")
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} segment manifests."))
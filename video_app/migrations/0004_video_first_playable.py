@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0003_video_source_probe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='first_playable_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='time_to_first_playable',
+            field=models.FloatField(blank=True, help_text='Seconds from upload until the first rendition was playable.', null=True),
+        ),
+    ]
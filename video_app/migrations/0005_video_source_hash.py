@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:47
+
+import video_app.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0004_video_first_playable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='source_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='SHA-256 of the uploaded source file.', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='video_file',
+            field=video_app.fields.HashedFileField(hash_field='source_hash', upload_to='videos/'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0005_video_source_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EncodeStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(max_length=20)),
+                ('ladder_signature', models.CharField(blank=True, max_length=20)),
+                ('chunk_index', models.PositiveIntegerField(blank=True, null=True)),
+                ('wall_time', models.FloatField(help_text='Seconds from start to end of the encode.')),
+                ('cpu_time', models.FloatField(help_text='User and system CPU seconds of the ffmpeg processes.')),
+                ('output_bytes', models.JSONField(blank=True, default=dict, help_text='Bytes written per rendition.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='encode_stats', to='video_app.video')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
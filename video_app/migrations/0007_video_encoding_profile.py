@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0006_encodestat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='encoding_profile',
+            field=models.JSONField(blank=True, default=dict, help_text='Per-title analysis result and bitrate caps per rendition.'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0007_video_encoding_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='has_trickplay',
+            field=models.BooleanField(default=False, help_text='Seek preview sprites and WebVTT index exist.'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='thumbnail_sizes',
+            field=models.JSONField(blank=True, default=dict, help_text='Thumbnail file per width in pixels.'),
+        ),
+    ]
@@ -1,15 +1,90 @@
 """Models for video content management."""
+import uuid
+
 from django.db import models
 
+from .fields import HashedFileField
+
 class Video(models.Model):
     """Model representing a video with metadata and file references."""
+
+    class ProcessingStatus(models.TextChoices):
+        PENDING = "pending", "Pending"
+        PROCESSING = "processing", "Processing"
+        READY = "ready", "Ready"
+        PARTIAL = "partial", "Partially ready"
+        FAILED = "failed", "Failed"
     
     title = models.CharField(max_length=255)
     description = models.TextField()
-    video_file = models.FileField(upload_to='videos/')
+    video_file = HashedFileField(upload_to='videos/', hash_field='source_hash')
     thumbnail = models.FileField(upload_to='thumbnails/', null=True, blank=True)
+    thumbnail_sizes = models.JSONField(default=dict, blank=True, help_text="Thumbnail file per width in pixels.")
+    has_trickplay = models.BooleanField(default=False, help_text="Seek preview sprites and WebVTT index exist.")
+    category = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processing_status = models.CharField(max_length=20, choices=ProcessingStatus.choices, default=ProcessingStatus.PENDING)
+    failed_variants = models.JSONField(default=list, blank=True)
+    hls_variants = models.JSONField(default=list, blank=True)
+    first_playable_at = models.DateTimeField(null=True, blank=True)
+    time_to_first_playable = models.FloatField(null=True, blank=True, help_text="Seconds from upload until the first rendition was playable.")
+
+    duration = models.FloatField(null=True, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    frame_rate = models.FloatField(null=True, blank=True)
+    video_codec = models.CharField(max_length=50, blank=True)
+    audio_codec = models.CharField(max_length=50, blank=True)
+    audio_channels = models.PositiveSmallIntegerField(null=True, blank=True)
+    audio_channel_layout = models.CharField(max_length=50, blank=True)
+
+    encoding_profile = models.JSONField(default=dict, blank=True, help_text="Per-title analysis result and bitrate caps per rendition.")
+
+    source_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False, help_text="SHA-256 of the uploaded source file.")
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the catalog, overall and per category
+            models.Index(fields=["-created_at", "-id"], name="video_created_id_idx"),
+            models.Index(fields=["category", "-created_at", "-id"], name="video_category_created_id_idx"),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class EncodeStat(models.Model):
+    """Resource usage and output size of one finished transcoding job."""
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="encode_stats")
+    mode = models.CharField(max_length=20)
+    ladder_signature = models.CharField(max_length=20, blank=True)
+    chunk_index = models.PositiveIntegerField(null=True, blank=True)
+    wall_time = models.FloatField(help_text="Seconds from start to end of the encode.")
+    cpu_time = models.FloatField(help_text="User and system CPU seconds of the ffmpeg processes.")
+    output_bytes = models.JSONField(default=dict, blank=True, help_text="Bytes written per rendition.")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.video} ({self.mode}, {self.wall_time:.1f}s)"
+
+
+class VideoUpload(models.Model):
+    """Resumable chunked upload of a video source, committed into a Video once complete."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    title = models.CharField(max_length=255)
+    description = models.TextField()
     category = models.CharField(max_length=100)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(help_text="Total length of the upload in bytes.")
+    offset = models.PositiveBigIntegerField(default=0, help_text="Bytes received so far.")
+    video = models.OneToOneField(Video, on_delete=models.SET_NULL, null=True, blank=True, related_name="upload")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f"{self.filename} ({self.offset}/{self.size})"
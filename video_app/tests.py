@@ -1,3 +1,436 @@
-from django.test import TestCase
+import hashlib, io, os, tempfile, time
 
-# Create your tests here.
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .api.async_views import authenticate
+from .api.catalog import affects_catalog, bump_catalog_version
+from .api.delivery import parse_range_header
+from .api.hotcache import HotCache, is_hot_file
+from .api.manifests import SEGMENT_MANIFEST_NAME, build_segment_manifest, forget_manifest, remember_manifest
+from .api.pagination import VideoCursorPagination
+from .api.signals import catalog_changed
+from .api.signing import SegmentTokenUser, get_token_expiry, make_segment_token, verify_segment_token
+from .api.uploads import UploadConflict, append_chunk, commit_upload, create_upload, get_upload_path
+from .api.utils import get_hls_variant_dir
+from .api.views import VideoHlsPlaylistView, VideoHlsSegmentView, VideoListView, VideoUploadDetailView
+from .models import Video
+
+
+class RangeHeaderTests(SimpleTestCase):
+    """Single "bytes=" ranges: satisfiable, ignored (None) or unsatisfiable (False)."""
+
+    def test_closed_range(self):
+        self.assertEqual(parse_range_header("bytes=0-99", 1000), (0, 99))
+
+    def test_open_range_runs_to_the_end(self):
+        self.assertEqual(parse_range_header("bytes=500-", 1000), (500, 999))
+
+    def test_end_is_clamped_to_the_file(self):
+        self.assertEqual(parse_range_header("bytes=900-5000", 1000), (900, 999))
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_range_header("bytes=-100", 1000), (900, 999))
+        self.assertEqual(parse_range_header("bytes=-5000", 1000), (0, 999))
+
+    def test_unsatisfiable_ranges(self):
+        self.assertIs(parse_range_header("bytes=1000-", 1000), False)
+        self.assertIs(parse_range_header("bytes=-0", 1000), False)
+
+    def test_ignored_headers(self):
+        for header in ("", "bytes=-", "bytes=50-10", "items=0-1", "bytes=0-1,5-9"):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range_header(header, 1000))
+
+
+class SegmentTokenTests(SimpleTestCase):
+    """HMAC segment tokens are bound to user, video, rendition and expiry."""
+
+    def setUp(self):
+        self.expires = int(time.time()) + 60
+        self.token = make_segment_token(7, 42, "720p", self.expires)
+
+    def test_valid_token_returns_the_user(self):
+        self.assertEqual(verify_segment_token(self.token, 42, "720p"), 7)
+
+    def test_token_is_bound_to_video_and_rendition(self):
+        self.assertIsNone(verify_segment_token(self.token, 43, "720p"))
+        self.assertIsNone(verify_segment_token(self.token, 42, "480p"))
+
+    def test_tampered_claims_are_rejected(self):
+        user_id, expires, signature = self.token.split(".")
+        self.assertIsNone(verify_segment_token(f"8.{expires}.{signature}", 42, "720p"))
+        self.assertIsNone(verify_segment_token(f"{user_id}.{self.expires + 3600}.{signature}", 42, "720p"))
+
+    def test_expired_token_is_rejected(self):
+        token = make_segment_token(7, 42, "720p", int(time.time()) - 1)
+        self.assertIsNone(verify_segment_token(token, 42, "720p"))
+
+    def test_malformed_tokens_are_rejected(self):
+        for token in ("", "abc", "7.x.sig", "7.1.2.3"):
+            with self.subTest(token=token):
+                self.assertIsNone(verify_segment_token(token, 42, "720p"))
+
+    @override_settings(HLS_SIGNED_URL_TTL=100)
+    def test_expiry_covers_the_video_duration(self):
+        now = time.time()
+        self.assertAlmostEqual(get_token_expiry(600), now + 700, delta=2)
+        self.assertAlmostEqual(get_token_expiry(), now + 100, delta=2)
+
+
+class MediaRootMixin:
+    """Run each test against an empty, temporary MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class ResumableUploadTests(MediaRootMixin, TestCase):
+    """tus-style chunked uploads: offsets, conflicts and the commit into a Video."""
+
+    def setUp(self):
+        super().setUp()
+        self.upload = create_upload(title="Clip", description="Test clip", category="Drama", filename="clip.mp4", size=10)
+        self.admin = get_user_model().objects.create_user("admin", "admin@example.com", "secret", is_staff=True)
+        self.factory = APIRequestFactory()
+
+    def patch(self, body: bytes, offset: int):
+        return self.factory.patch(
+            f"/api/uploads/{self.upload.id}/", body, content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def send(self, request):
+        force_authenticate(request, user=self.admin)
+        return VideoUploadDetailView.as_view()(request, upload_id=self.upload.id)
+
+    def test_chunks_are_appended_at_the_offset(self):
+        append_chunk(self.upload.id, 0, io.BytesIO(b"01234"), 5)
+        upload = append_chunk(self.upload.id, 5, io.BytesIO(b"56789"), 5)
+        self.assertEqual(upload.offset, 10)
+        self.assertEqual(get_upload_path(upload).read_bytes(), b"0123456789")
+
+    def test_wrong_offset_is_a_conflict(self):
+        append_chunk(self.upload.id, 0, io.BytesIO(b"01234"), 5)
+        with self.assertRaises(UploadConflict):
+            append_chunk(self.upload.id, 0, io.BytesIO(b"01234"), 5)
+
+    def test_chunk_past_the_announced_length_is_a_conflict(self):
+        with self.assertRaises(UploadConflict):
+            append_chunk(self.upload.id, 0, io.BytesIO(b"0123456789AB"), 12)
+
+    def test_commit_needs_every_byte(self):
+        append_chunk(self.upload.id, 0, io.BytesIO(b"01234"), 5)
+        with self.assertRaises(UploadConflict):
+            commit_upload(self.upload.id)
+
+    def test_commit_creates_the_video_once(self):
+        append_chunk(self.upload.id, 0, io.BytesIO(b"0123456789"), 10)
+        video = commit_upload(self.upload.id)
+        self.assertEqual(video.source_hash, hashlib.sha256(b"0123456789").hexdigest())
+        self.assertEqual(commit_upload(self.upload.id), video)
+
+    def test_patch_reports_the_new_offset(self):
+        response = self.send(self.patch(b"01234", 0))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response["Upload-Offset"], "5")
+
+    def test_patch_at_a_stale_offset_returns_409_with_the_current_offset(self):
+        self.send(self.patch(b"01234", 0))
+        response = self.send(self.patch(b"01234", 0))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Upload-Offset"], "5")
+
+    def test_patch_without_content_length_returns_411(self):
+        request = self.patch(b"01234", 0)
+        del request.META["CONTENT_LENGTH"]
+        response = self.send(request)
+        self.assertEqual(response.status_code, 411)
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.offset, 0)
+
+
+@override_settings(HLS_HOT_CACHE_SEGMENTS=3)
+class HotCacheTests(MediaRootMixin, SimpleTestCase):
+    """Which files are hot, and how the cache notices changed files."""
+
+    def test_playlists_and_leading_segments_are_hot(self):
+        for name in ("index.m3u8", "master.m3u8", "seg_00000.ts", "seg_00002.m4s"):
+            with self.subTest(name=name):
+                self.assertTrue(is_hot_file(Path("/hls/1/720p") / name))
+        for name in ("seg_00003.ts", "stream.ts", "segments.json", "sprite_000.webp"):
+            with self.subTest(name=name):
+                self.assertFalse(is_hot_file(Path("/hls/1/720p") / name))
+
+    def test_init_sections_of_every_mode_are_hot(self):
+        for name in ("init.mp4", "init_0.mp4", "init_12.mp4", "init_0_00000.mp4"):
+            with self.subTest(name=name):
+                self.assertTrue(is_hot_file(Path("/hls/1/720p") / name))
+        self.assertFalse(is_hot_file(Path("/hls/1/720p/init_.mp4")))
+
+    def test_changed_file_is_reloaded(self):
+        cache = HotCache(1024, 512)
+        path = Path(settings.MEDIA_ROOT) / "index.m3u8"
+        path.write_bytes(b"#EXTM3U\n")
+        self.assertEqual(cache.read(path), b"#EXTM3U\n")
+        self.assertEqual(cache.read(path), b"#EXTM3U\n")
+
+        path.write_bytes(b"#EXTM3U\n#EXT-X-ENDLIST\n")
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+        self.assertEqual(cache.read(path), b"#EXTM3U\n#EXT-X-ENDLIST\n")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["invalidations"]), (1, 2, 1))
+
+    def test_large_files_are_not_cached(self):
+        cache = HotCache(1024, 4)
+        path = Path(settings.MEDIA_ROOT) / "seg_00000.ts"
+        path.write_bytes(b"0123456789")
+        self.assertIsNone(cache.read(path))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+
+PLAYLIST = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:6
+#EXT-X-PLAYLIST-TYPE:VOD
+#EXTINF:6.000000,
+seg_00000.ts
+#EXTINF:4.000000,
+seg_00001.ts
+#EXT-X-ENDLIST
+"""
+
+
+class SegmentDeliveryTests(MediaRootMixin, TestCase):
+    """Playlist and segment views answered from the rendition's segment manifest."""
+
+    def setUp(self):
+        super().setUp()
+        self.video = Video.objects.create(title="Clip", description="Test clip", category="Drama", video_file="videos/clip.mp4")
+        self.user = get_user_model().objects.create_user("viewer", "viewer@example.com", "secret")
+        self.factory = APIRequestFactory()
+
+        variant_dir = get_hls_variant_dir(self.video.id, "720p")
+        variant_dir.mkdir(parents=True)
+        (variant_dir / "index.m3u8").write_text(PLAYLIST, encoding="utf-8")
+        (variant_dir / "seg_00000.ts").write_bytes(b"0123456789")
+        (variant_dir / "seg_00001.ts").write_bytes(b"abcdef")
+        (variant_dir / SEGMENT_MANIFEST_NAME).write_text("{}", encoding="utf-8")
+        # The in-process copy stands in for the Redis hash
+        remember_manifest((self.video.id, "720p"), build_segment_manifest(variant_dir))
+        self.addCleanup(forget_manifest, self.video.id)
+
+    def get_segment(self, segment: str, **headers):
+        request = self.factory.get(f"/api/video/{self.video.id}/720p/{segment}/", **headers)
+        force_authenticate(request, user=self.user)
+        response = VideoHlsSegmentView.as_view()(request, movie_id=self.video.id, resolution="720p", segment=segment)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response) -> bytes:
+        return b"".join(response.streaming_content) if response.streaming else response.content
+
+    def test_listed_segment_is_served_with_validators(self):
+        response = self.get_segment("seg_00000.ts")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), b"0123456789")
+        self.assertIn("ETag", response)
+        self.assertTrue(response["Repr-Digest"].startswith("sha-256=:"))
+
+    def test_files_the_manifest_does_not_list_are_404(self):
+        for segment in (SEGMENT_MANIFEST_NAME, "seg_00002.ts"):
+            with self.subTest(segment=segment):
+                self.assertEqual(self.get_segment(segment).status_code, 404)
+
+    def test_range_request_returns_206(self):
+        response = self.get_segment("seg_00000.ts", HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+
+    def test_unsatisfiable_range_returns_416(self):
+        response = self.get_segment("seg_00000.ts", HTTP_RANGE="bytes=10-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_revalidation_returns_304(self):
+        etag = self.get_segment("seg_00000.ts")["ETag"]
+        self.assertEqual(self.get_segment("seg_00000.ts", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_if_range_with_an_old_etag_sends_the_whole_file(self):
+        response = self.get_segment("seg_00000.ts", HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"0-0"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), b"0123456789")
+
+    def test_playlist_is_served_from_the_manifest(self):
+        request = self.factory.get(f"/api/video/{self.video.id}/720p/index.m3u8")
+        force_authenticate(request, user=self.user)
+        response = VideoHlsPlaylistView.as_view()(request, movie_id=self.video.id, resolution="720p")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response).decode(), PLAYLIST)
+
+
+@override_settings(CATALOG_CACHE_TTL=0)
+class CursorPaginationTests(TestCase):
+    """Keyset pages over (created_at, id), including rows with equal timestamps."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("viewer", "viewer@example.com", "secret")
+        self.factory = APIRequestFactory()
+        now = timezone.now()
+        for i in range(7):
+            video = Video.objects.create(title=f"Video {i}", description="", category="Drama" if i % 2 else "Comedy", video_file="videos/clip.mp4")
+            # Pairs of videos share a timestamp, so the id has to break ties
+            Video.objects.filter(id=video.id).update(created_at=now - timedelta(minutes=i // 2))
+        self.expected = [video.title for video in Video.objects.order_by("-created_at", "-id")]
+
+    def get_page(self, **params):
+        request = self.factory.get("/api/video/", params)
+        force_authenticate(request, user=self.user)
+        response = VideoListView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def cursor(self, link: str) -> str:
+        return parse_qs(urlparse(link).query)["cursor"][0]
+
+    def test_cursor_round_trip(self):
+        pagination = VideoCursorPagination()
+        video = Video.objects.first()
+        for reverse in (False, True):
+            cursor = pagination.encode_cursor(video, reverse=reverse)
+            request = Request(self.factory.get("/api/video/", {"cursor": cursor}))
+            self.assertEqual(pagination.decode_cursor(request), (video.created_at, video.id, reverse))
+
+    def test_invalid_cursor_is_404(self):
+        pagination = VideoCursorPagination()
+        for cursor in ("not-base64!", "bm9wZQ", "eHx5fHo"):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(NotFound):
+                    pagination.decode_cursor(Request(self.factory.get("/api/video/", {"cursor": cursor})))
+
+    def test_pages_cover_every_row_once_in_both_directions(self):
+        pages = [self.get_page(page_size=3)]
+        while pages[-1]["next"]:
+            pages.append(self.get_page(page_size=3, cursor=self.cursor(pages[-1]["next"])))
+        self.assertEqual([video["title"] for page in pages for video in page["results"]], self.expected)
+        self.assertIsNone(pages[0]["previous"])
+
+        back = self.get_page(page_size=3, cursor=self.cursor(pages[-1]["previous"]))
+        self.assertEqual(back["results"], pages[-2]["results"])
+
+    def test_category_pages(self):
+        page = self.get_page(category="Drama", page_size=2)
+        self.assertEqual([video["title"] for video in page["results"]], [t for t in self.expected if int(t.split()[1]) % 2][:2])
+        self.assertIsNotNone(page["next"])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "catalog-tests"}},
+    CATALOG_CACHE_TTL=300,
+)
+class CatalogCacheTests(TestCase):
+    """Versioned catalog pages with ETag / 304."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user("viewer", "viewer@example.com", "secret")
+        self.factory = APIRequestFactory()
+        self.video = Video.objects.create(title="Clip", description="Test clip", category="Drama", video_file="videos/clip.mp4")
+
+    def get_list(self, **headers):
+        request = self.factory.get("/api/video/", **headers)
+        force_authenticate(request, user=self.user)
+        return VideoListView.as_view()(request)
+
+    def test_cached_page_needs_no_query(self):
+        first = self.get_list()
+        with self.assertNumQueries(0):
+            second = self.get_list()
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_matching_etag_returns_304(self):
+        etag = self.get_list()["ETag"]
+        self.assertEqual(self.get_list(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_version_bump_serves_a_fresh_page(self):
+        first = self.get_list()
+        Video.objects.filter(id=self.video.id).update(title="Renamed")
+        self.assertEqual(self.get_list().data, first.data)
+
+        bump_catalog_version()
+        response = self.get_list(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+        self.assertEqual(response.data["results"][0]["title"], "Renamed")
+
+    def test_catalog_saves_bump_the_version_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.video.save(update_fields=["title"])
+        self.assertIn(catalog_changed, callbacks)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.video.save(update_fields=["processing_status"])
+        self.assertNotIn(catalog_changed, callbacks)
+
+    def test_affects_catalog(self):
+        self.assertTrue(affects_catalog(None))
+        self.assertTrue(affects_catalog(["hls_variants", "processing_status"]))
+        self.assertFalse(affects_catalog(["processing_status", "failed_variants"]))
+
+
+class AsyncAuthenticationTests(TestCase):
+    """The async views authenticate like the DRF chain: segment token, cookie, then header."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("viewer", "viewer@example.com", "secret")
+        self.token = str(AccessToken.for_user(self.user))
+        self.factory = AsyncRequestFactory()
+
+    def request(self, cookie: str = None, header: str = None, **params):
+        request = self.factory.get("/api/video/1/720p/seg_00000.ts/", params, headers={"Authorization": f"Bearer {header}"} if header else None)
+        if cookie:
+            request.COOKIES["access_token"] = cookie
+        return request
+
+    async def test_access_token_cookie(self):
+        user, error = await authenticate(self.request(cookie=self.token), 1, "720p")
+        self.assertIsNone(error)
+        self.assertEqual(user.pk, self.user.pk)
+
+    async def test_invalid_cookie_falls_back_to_the_header(self):
+        user, error = await authenticate(self.request(cookie="expired.or.invalid", header=self.token), 1, "720p")
+        self.assertIsNone(error)
+        self.assertEqual(user.pk, self.user.pk)
+
+    async def test_invalid_or_missing_credentials_are_401(self):
+        for request in (self.request(cookie="expired.or.invalid"), self.request(header="invalid"), self.request()):
+            user, error = await authenticate(request, 1, "720p")
+            self.assertIsNone(user)
+            self.assertEqual(error.status_code, 401)
+
+    async def test_segment_token(self):
+        token = make_segment_token(self.user.pk, 1, "720p", get_token_expiry())
+        user, error = await authenticate(self.request(token=token), 1, "720p")
+        self.assertIsInstance(user, SegmentTokenUser)
+        self.assertEqual(user.id, self.user.pk)
+
+        user, error = await authenticate(self.request(token=token), 1, "1080p")
+        self.assertEqual(error.status_code, 403)